@@ -1,11 +1,29 @@
 import argparse
 import logging
 
-from utbot_executor.listener import PythonExecuteServer
+from utbot_executor.deep_serialization.cache import LRUCache
+from utbot_executor.deep_serialization.codec import CODECS, set_codec
+from utbot_executor.deep_serialization.config import SerializationLimits
+from utbot_executor.executor import DUMP_CACHE_ITEMS, DUMP_CACHE_SIZE, VALUE_CACHE_ITEMS, \
+    VALUE_CACHE_SIZE, MEMORY_HANDLES_ITEMS, MEMORY_HANDLES_SIZE, COVERAGE_SESSIONS_ITEMS, \
+    COVERAGE_BITMAPS_ITEMS, SATURATION_FUNCTIONS_ITEMS, TIMEOUT_GRACE_MS
+from utbot_executor.listener import QUEUE_SIZE, PythonExecuteServer
 
 
-def main(hostname: str, port: int, coverage_hostname: str, coverage_port: str):
-    server = PythonExecuteServer(hostname, port, coverage_hostname, coverage_port)
+def main(
+        hostname: str,
+        port: int,
+        coverage_hostname: str,
+        coverage_port: str,
+        **executor_options,
+        ):
+    server = PythonExecuteServer(
+            hostname,
+            port,
+            coverage_hostname,
+            coverage_port,
+            **executor_options,
+            )
     server.run()
 
 
@@ -24,6 +42,29 @@ if __name__ == '__main__':
             )
     parser.add_argument('coverage_hostname')
     parser.add_argument('coverage_port', type=int)
+    parser.add_argument('--max-container-items', type=int, default=None)
+    parser.add_argument('--max-objects', type=int, default=None)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--intern-values', action='store_true')
+    parser.add_argument('--dump-cache-items', type=int, default=DUMP_CACHE_ITEMS)
+    parser.add_argument('--dump-cache-size', type=int, default=DUMP_CACHE_SIZE)
+    parser.add_argument('--value-cache-items', type=int, default=VALUE_CACHE_ITEMS)
+    parser.add_argument('--value-cache-size', type=int, default=VALUE_CACHE_SIZE)
+    parser.add_argument('--memory-handles-items', type=int, default=MEMORY_HANDLES_ITEMS)
+    parser.add_argument('--memory-handles-size', type=int, default=MEMORY_HANDLES_SIZE)
+    parser.add_argument('--coverage-sessions-items', type=int, default=COVERAGE_SESSIONS_ITEMS)
+    parser.add_argument('--coverage-bitmap', default=None)
+    parser.add_argument('--coverage-bitmaps-items', type=int, default=COVERAGE_BITMAPS_ITEMS)
+    parser.add_argument('--saturation-threshold', type=int, default=None)
+    parser.add_argument('--saturation-trace-every', type=int, default=0)
+    parser.add_argument('--saturation-functions-items', type=int, default=SATURATION_FUNCTIONS_ITEMS)
+    parser.add_argument('--timeout-ms', type=int, default=None)
+    parser.add_argument('--timeout-grace-ms', type=int, default=TIMEOUT_GRACE_MS)
+    parser.add_argument('--memory-limit', type=int, default=None)
+    parser.add_argument('--metrics', action='store_true')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--shared-memory-ring', default=None)
+    parser.add_argument('--json-codec', choices=['auto', *CODECS], default='auto')
     args = parser.parse_args()
 
     loglevel = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "ERROR": logging.ERROR}[args.loglevel]
@@ -33,4 +74,31 @@ if __name__ == '__main__':
             datefmt='%m/%d/%Y %H:%M:%S',
             level=loglevel,
             )
-    main(args.hostname, args.port, args.coverage_hostname, args.coverage_port)
+    logging.info('JSON codec: %s', set_codec(args.json_codec).name)
+    main(
+            args.hostname,
+            args.port,
+            args.coverage_hostname,
+            args.coverage_port,
+            queue_size=args.queue_size,
+            shared_memory_ring=args.shared_memory_ring,
+            serialization_limits=SerializationLimits(
+                args.max_container_items,
+                args.max_objects,
+                args.max_depth,
+                ),
+            intern_values=args.intern_values,
+            dump_cache=LRUCache(args.dump_cache_items, args.dump_cache_size),
+            value_cache=LRUCache(args.value_cache_items, args.value_cache_size),
+            memory_handles=LRUCache(args.memory_handles_items, args.memory_handles_size),
+            coverage_sessions=LRUCache(args.coverage_sessions_items),
+            coverage_bitmap=args.coverage_bitmap,
+            coverage_bitmaps_items=args.coverage_bitmaps_items,
+            saturation_threshold=args.saturation_threshold,
+            saturation_trace_every=args.saturation_trace_every,
+            saturation_functions_items=args.saturation_functions_items,
+            timeout_ms=args.timeout_ms,
+            timeout_grace_ms=args.timeout_grace_ms,
+            memory_limit=args.memory_limit,
+            collect_metrics=args.metrics,
+            )
@@ -0,0 +1,94 @@
+"""Coverage encodings for execution responses, shared memory coverage bitmap
+and coverage saturation tracking."""
+from typing import Hashable, Iterable, List
+
+from utbot_executor.deep_serialization.cache import LRUCache
+from utbot_executor.transport import attach_shared_memory
+
+COVERAGE_ENCODINGS = ('list', 'ranges')
+SATURATION_FUNCTIONS_ITEMS = 1024
+
+
+def to_ranges(lines: Iterable[int]) -> List[List[int]]:
+    """Encode line numbers as sorted `[first, last]` ranges of consecutive lines."""
+    ranges: List[List[int]] = []
+    for line in sorted(set(lines)):
+        if ranges and ranges[-1][1] == line - 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return ranges
+
+
+def from_ranges(ranges: Iterable[List[int]]) -> List[int]:
+    return [line for first, last in ranges for line in range(first, last + 1)]
+
+
+class CoverageBitmap:
+    """Line hit counters in a shared memory segment created by the client.
+
+    Byte `n` is the hit counter of line `n` of the tested file, saturating at 255;
+    lines which do not fit into the segment are not counted. The client owns
+    the segment: the executor never clears or unlinks it."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.segment = attach_shared_memory(name)
+        self.buffer = self.segment.buf
+
+    def hit(self, lineno: int) -> None:
+        if lineno < len(self.buffer):
+            hits = self.buffer[lineno]
+            if hits < 255:
+                self.buffer[lineno] = hits + 1
+
+    def close(self) -> None:
+        self.segment.close()
+
+
+class _FunctionSaturation:
+    __slots__ = ('covered', 'stale', 'skipped')
+
+    def __init__(self):
+        self.covered: set = set()
+        self.stale = 0
+        self.skipped = 0
+
+
+class CoverageSaturation:
+    """Coverage growth of each function.
+
+    A function is saturated after `threshold` consecutive traced executions without
+    new lines. Then only every `trace_every`-th execution is traced (none if it is 0)
+    until a traced execution finds new lines. States of at most `max_functions`
+    recently executed functions are kept."""
+
+    def __init__(self, threshold: int, trace_every: int = 0, max_functions: int = SATURATION_FUNCTIONS_ITEMS):
+        self.threshold = threshold
+        self.trace_every = trace_every
+        self.functions = LRUCache(max_functions)
+
+    def should_trace(self, key: Hashable) -> bool:
+        state = self.functions.get(key)
+        if state is None or state.stale < self.threshold:
+            return True
+        state.skipped += 1
+        if self.trace_every > 0 and state.skipped >= self.trace_every:
+            state.skipped = 0
+            return True
+        return False
+
+    def update(self, key: Hashable, lines: Iterable[Hashable]) -> bool:
+        """Add lines covered by a traced execution, returns `True` if there are new lines."""
+        state = self.functions.get(key)
+        if state is None:
+            state = _FunctionSaturation()
+            self.functions.put(key, state)
+        size = len(state.covered)
+        state.covered.update(lines)
+        if len(state.covered) > size:
+            state.stale = 0
+            state.skipped = 0
+            return True
+        state.stale += 1
+        return False
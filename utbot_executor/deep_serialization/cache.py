@@ -0,0 +1,79 @@
+import collections
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Least recently used cache limited by number of items and their total size.
+
+    `on_evict` is called with every value which is evicted or cleared."""
+
+    def __init__(
+            self,
+            max_items: int,
+            max_size: Optional[int] = None,
+            on_evict: Optional[Callable[[Any], None]] = None,
+            ):
+        self.max_items = max_items
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.items: collections.OrderedDict = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.items
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self.items.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> None:
+        if self.max_items <= 0 or (self.max_size is not None and size > self.max_size):
+            return
+        self.pop(key)
+        self.items[key] = (value, size)
+        self.size += size
+        while len(self.items) > self.max_items or (
+            self.max_size is not None and self.size > self.max_size
+        ):
+            _, (old_value, old_size) = self.items.popitem(last=False)
+            self.size -= old_size
+            if self.on_evict is not None:
+                self.on_evict(old_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self.items.pop(key, None)
+        if item is None:
+            return default
+        self.size -= item[1]
+        return item[0]
+
+    def clear(self) -> None:
+        if self.on_evict is not None:
+            for value, _ in self.items.values():
+                self.on_evict(value)
+        self.items.clear()
+        self.size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "items": len(self.items),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hit_rate,
+        }
@@ -0,0 +1,126 @@
+"""JSON codecs used for memory dumps, requests and responses.
+
+Memory objects and responses are converted to plain dicts and lists before
+encoding, so every codec only has to handle JSON-compatible values. Decoded
+objects may be converted by an `object_hook`, as in `json.loads`."""
+import abc
+import contextlib
+import gc
+import json
+import threading
+from typing import Any, Callable, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec(abc.ABC):
+    name: str
+    # `object_hook` of `loads` is applied while decoding, otherwise in a second pass
+    hooks_while_decoding: bool = False
+
+    @abc.abstractmethod
+    def dumps(self, obj: Any) -> str:
+        ...
+
+    @abc.abstractmethod
+    def loads(self, data: Union[str, bytes], object_hook: Optional[Callable[[Dict], Any]] = None) -> Any:
+        ...
+
+
+class StdlibJsonCodec(JsonCodec):
+    name = "stdlib"
+    hooks_while_decoding = True
+
+    def __init__(self):
+        self.encoder = json.JSONEncoder(separators=(",", ":"))
+        self.decoder = json.JSONDecoder()
+
+    def dumps(self, obj: Any) -> str:
+        return self.encoder.encode(obj)
+
+    def loads(self, data: Union[str, bytes], object_hook: Optional[Callable[[Dict], Any]] = None) -> Any:
+        if isinstance(data, bytes):
+            data = data.decode()
+        if object_hook is not None:
+            # objects are converted while decoding, in a single pass
+            return json.JSONDecoder(object_hook=object_hook).decode(data)
+        return self.decoder.decode(data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, data: Union[str, bytes], object_hook: Optional[Callable[[Dict], Any]] = None) -> Any:
+        value = orjson.loads(data)
+        if object_hook is not None:
+            # orjson has no hooks, decoded objects are converted in a second pass
+            return _apply_object_hook(value, object_hook)
+        return value
+
+
+def _apply_object_hook(value: Any, object_hook: Callable[[Dict], Any]) -> Any:
+    """Convert decoded objects from the innermost ones, as `json.loads` does."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (dict, list)):
+                value[key] = _apply_object_hook(item, object_hook)
+        return object_hook(value)
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, (dict, list)):
+                value[i] = _apply_object_hook(item, object_hook)
+    return value
+
+
+CODECS: Dict[str, type] = {
+    StdlibJsonCodec.name: StdlibJsonCodec,
+}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec
+
+DEFAULT_CODEC = "orjson" if orjson is not None else "stdlib"
+
+codec: JsonCodec = CODECS[DEFAULT_CODEC]()
+
+
+def get_codec() -> JsonCodec:
+    return codec
+
+
+def set_codec(name: str = "auto") -> JsonCodec:
+    """Select codec by name, `auto` selects the fastest available one."""
+    global codec
+    if name == "auto":
+        name = DEFAULT_CODEC
+    if name not in CODECS:
+        raise ValueError(f"JSON codec {name} is not available")
+    codec = CODECS[name]()
+    return codec
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """Disable cyclic garbage collector while many acyclic objects are created.
+
+    Decoded JSON and memory objects have no reference cycles, but every
+    allocation counts towards the collector threshold, so large dumps
+    trigger many full collections.
+
+    The collector state is process-wide, so it is changed only in the main
+    thread, which executes the tested code; in other threads this does nothing."""
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
@@ -1,5 +1,25 @@
-from typing import Final, NewType
+import dataclasses
+from typing import Final, NewType, Optional
 
 PICKLE_PROTO: Final = 4
 
-PythonId = NewType('PythonId', str)
+PythonId = NewType('PythonId', int)
+
+
+@dataclasses.dataclass
+class SerializationLimits:
+    """Serialization budget, `None` means unlimited."""
+
+    max_container_items: Optional[int] = None
+    max_objects: Optional[int] = None
+    max_depth: Optional[int] = None
+
+    def override(self, limits: Optional['SerializationLimits']) -> 'SerializationLimits':
+        if limits is None:
+            return self
+        return SerializationLimits(**{
+            field.name: getattr(limits, field.name)
+            if getattr(limits, field.name) is not None
+            else getattr(self, field.name)
+            for field in dataclasses.fields(self)
+        })
@@ -1,13 +1,14 @@
-import json
+import collections
+import datetime
+import decimal
+import fractions
+import uuid
 from typing import Any, Dict, Tuple, List
 
 from utbot_executor.deep_serialization.memory_objects import PythonSerializer, MemoryDump
-from utbot_executor.deep_serialization.json_converter import MemoryDumpEncoder, deserialize_memory_objects, DumpLoader
-from utbot_executor.deep_serialization.utils import PythonId
-
-
-def serialize_memory_dump(dump: MemoryDump):
-    return json.dumps({'objects': dump}, cls=MemoryDumpEncoder)
+from utbot_executor.deep_serialization.json_converter import deserialize_memory_objects, DumpLoader, \
+    serialize_memory_dump
+from utbot_executor.deep_serialization.utils import PythonId, decode_id, encode_id
 
 
 def serialize_object(obj: Any) -> Tuple[str, str]:
@@ -18,10 +19,10 @@ def serialize_object(obj: Any) -> Tuple[str, str]:
 
     serializer = PythonSerializer()
     id_ = serializer.write_object_to_memory(obj)
-    return id_, serialize_memory_dump(serializer.memory)
+    return encode_id(id_), serialize_memory_dump(serializer.memory)
 
 
-def serialize_objects(objs: List[Any], clear_visited: bool = False) -> Tuple[List[PythonId], str]:
+def serialize_objects(objs: List[Any], clear_visited: bool = False) -> Tuple[List[str], str]:
     """
     Serialize objects with shared memory.
     Returns list of object ids and memory dump.
@@ -31,16 +32,16 @@ def serialize_objects(objs: List[Any], clear_visited: bool = False) -> Tuple[Lis
     if clear_visited:
         serializer.clear_visited()
     ids = [
-        serializer.write_object_to_memory(obj)
+        encode_id(serializer.write_object_to_memory(obj))
         for obj in objs
     ]
     return ids, serialize_memory_dump(serializer.memory)
 
 
-def serialize_objects_dump(objs: List[Any], clear_visited: bool = False) -> Tuple[List[PythonId], MemoryDump, str]:
+def write_objects_to_memory(objs: List[Any], clear_visited: bool = False) -> Tuple[List[PythonId], MemoryDump]:
     """
-    Serialize objects with shared memory.
-    Returns list of object ids and memory dump.
+    Serialize objects with shared memory, like `PythonSerializer.write_object_to_memory`.
+    Returns list of not encoded (int) object ids and not encoded memory dump.
     """
 
     serializer = PythonSerializer()
@@ -50,7 +51,17 @@ def serialize_objects_dump(objs: List[Any], clear_visited: bool = False) -> Tupl
         serializer.write_object_to_memory(obj)
         for obj in objs
     ]
-    return ids, serializer.memory, serialize_memory_dump(serializer.memory)
+    return ids, serializer.memory
+
+
+def serialize_objects_dump(objs: List[Any], clear_visited: bool = False) -> Tuple[List[str], MemoryDump, str]:
+    """
+    Serialize objects with shared memory.
+    Returns list of object ids, not encoded memory dump and memory dump.
+    """
+
+    ids, memory = write_objects_to_memory(objs, clear_visited)
+    return [encode_id(id_) for id_ in ids], memory, serialize_memory_dump(memory)
 
 
 def deserialize_objects(ids: List[str], memory: str, imports: List[str]) -> Dict[str, object]:
@@ -62,4 +73,33 @@ def deserialize_objects(ids: List[str], memory: str, imports: List[str]) -> Dict
     memory_dump = deserialize_memory_objects(memory)
     loader = DumpLoader(memory_dump)
     loader.add_imports(imports)
-    return {python_id: loader.load_object(PythonId(python_id)) for python_id in ids}
+    return {python_id: loader.load_object(decode_id(python_id)) for python_id in ids}
+
+
+def _warm_up_objects() -> List[Any]:
+    return [
+        None, True, 1, 1.5, "a", b"a", bytearray(b"a"), int,
+        [1], (1,), {1}, frozenset({1}), {"a": 1},
+        collections.deque([1], maxlen=2),
+        collections.OrderedDict(a=1),
+        collections.Counter("a"),
+        collections.defaultdict(list, a=[1]),
+        datetime.datetime(2000, 1, 1), datetime.date(2000, 1, 1),
+        datetime.time(1), datetime.timedelta(1),
+        decimal.Decimal("1.5"), fractions.Fraction(1, 2), uuid.UUID(int=1),
+    ]
+
+
+def warm_up() -> List[Any]:
+    """
+    Serialize and deserialize objects of common types to fill per-type caches.
+    Returns deserialized objects.
+    """
+
+    serializer = PythonSerializer()
+    try:
+        ids, memory = serialize_objects(_warm_up_objects(), True)
+        objects = deserialize_objects(ids, memory, [])
+    finally:
+        serializer.clear()
+    return [objects[id_] for id_ in ids]
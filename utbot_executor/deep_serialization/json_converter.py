@@ -1,119 +1,337 @@
+import collections
 import copy
+import functools
 import importlib
 import json
 import sys
-from typing import Dict, Iterable, Union
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from utbot_executor.deep_serialization.cache import LRUCache
+from utbot_executor.deep_serialization.codec import get_codec, paused_gc
 from utbot_executor.deep_serialization.memory_objects import (
     MemoryObject,
     ReprMemoryObject,
+    ValueMemoryObject,
+    EnumMemoryObject,
     ListMemoryObject,
     DictMemoryObject,
+    FieldsMemoryObject,
     ReduceMemoryObject,
+    SummaryMemoryObject,
     MemoryDump,
+    PythonSerializer,
+)
+from utbot_executor.deep_serialization.utils import (
+    PythonId,
+    TypeInfo,
+    get_typeinfo,
+    decode_id,
+    encode_id,
+    load_type,
+    load_value_repr,
+    set_fields,
 )
-from utbot_executor.deep_serialization.utils import PythonId, TypeInfo
+
+
+@functools.lru_cache(maxsize=None)
+def typeinfo_to_dict(typeinfo: TypeInfo) -> Dict:
+    return {
+        "kind": typeinfo.kind,
+        "module": typeinfo.module,
+    }
+
+
+def _encode_value(o: MemoryObject, dct: Dict) -> None:
+    dct["value"] = o.value
+
+
+def _encode_list(o: MemoryObject, dct: Dict) -> None:
+    dct["items"] = [encode_id(id_) for id_ in o.items]
+    if o.typeinfo.fullname == "collections.deque":
+        dct["maxlen"] = o.maxlen
+
+
+def _encode_dict(o: MemoryObject, dct: Dict) -> None:
+    dct["items"] = {encode_id(key): encode_id(value) for key, value in o.items.items()}
+    if o.typeinfo.fullname == "collections.defaultdict":
+        dct["factory"] = encode_id(o.factory)
+
+
+def _encode_fields(o: MemoryObject, dct: Dict) -> None:
+    dct["fields"] = {name: encode_id(value) for name, value in o.fields.items()}
+
+
+def _encode_summary(o: MemoryObject, dct: Dict) -> None:
+    dct["length"] = o.length
+
+
+def _encode_reduce(o: MemoryObject, dct: Dict) -> None:
+    dct["constructor"] = typeinfo_to_dict(o.constructor)
+    dct["args"] = encode_id(o.args)
+    dct["state"] = encode_id(o.state)
+    dct["listitems"] = encode_id(o.listitems)
+    dct["dictitems"] = encode_id(o.dictitems)
+
+
+MEMORY_OBJECT_ENCODERS: Dict[str, Callable[[MemoryObject, Dict], None]] = {
+    "repr": _encode_value,
+    "value": _encode_value,
+    "enum": _encode_value,
+    "list": _encode_list,
+    "dict": _encode_dict,
+    "fields": _encode_fields,
+    "summary": _encode_summary,
+    "reduce": _encode_reduce,
+}
+
+
+def memory_object_to_dict(o: MemoryObject) -> Dict:
+    """Convert memory object to JSON-compatible dict."""
+    dct = {
+        "strategy": o.strategy,
+        "id": encode_id(o.id_value()),
+        "typeinfo": typeinfo_to_dict(o.typeinfo),
+        "comparable": o.comparable,
+    }
+    MEMORY_OBJECT_ENCODERS[o.strategy](o, dct)
+    return dct
+
+
+def memory_dump_to_dict(memory_dump: MemoryDump) -> Dict:
+    """Convert memory dump to JSON-compatible dict."""
+    return {
+        "objects": {
+            encode_id(id_): memory_object_to_dict(o)
+            for id_, o in memory_dump.objects.items()
+        }
+    }
 
 
 class MemoryObjectEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, MemoryObject):
-            base_json = {
-                "strategy": o.strategy,
-                "id": o.id_value(),
-                "typeinfo": o.typeinfo,
-                "comparable": o.comparable,
-            }
-            if isinstance(o, ReprMemoryObject):
-                base_json["value"] = o.value
-            elif isinstance(o, (ListMemoryObject, DictMemoryObject)):
-                base_json["items"] = o.items
-            elif isinstance(o, ReduceMemoryObject):
-                base_json["constructor"] = o.constructor
-                base_json["args"] = o.args
-                base_json["state"] = o.state
-                base_json["listitems"] = o.listitems
-                base_json["dictitems"] = o.dictitems
-            return base_json
+            return memory_object_to_dict(o)
         return json.JSONEncoder.default(self, o)
 
 
-class MemoryDumpEncoder(json.JSONEncoder):
+class MemoryDumpEncoder(MemoryObjectEncoder):
     def default(self, o):
         if isinstance(o, MemoryDump):
-            return {
-                id_: MemoryObjectEncoder().default(o) for id_, o in o.objects.items()
-            }
+            # memory objects are converted one by one while encoding
+            return {encode_id(id_): o for id_, o in o.objects.items()}
         if isinstance(o, TypeInfo):
-            return {
-                "kind": o.kind,
-                "module": o.module,
-            }
-        return json.JSONEncoder.default(self, o)
+            return typeinfo_to_dict(o)
+        return super().default(o)
+
+
+def _decode_repr(dct: Dict) -> MemoryObject:
+    obj = ReprMemoryObject.__new__(ReprMemoryObject)
+    obj.value = dct["value"]
+    return obj
+
+
+def _decode_value(dct: Dict) -> MemoryObject:
+    obj = ValueMemoryObject.__new__(ValueMemoryObject)
+    obj.value = dct["value"]
+    return obj
+
+
+def _decode_enum(dct: Dict) -> MemoryObject:
+    obj = EnumMemoryObject.__new__(EnumMemoryObject)
+    obj.value = dct["value"]
+    return obj
+
+
+def _decode_list(dct: Dict) -> MemoryObject:
+    obj = ListMemoryObject.__new__(ListMemoryObject)
+    obj.items = [decode_id(id_) for id_ in dct["items"]]
+    obj.maxlen = dct.get("maxlen")
+    return obj
+
+
+def _decode_dict(dct: Dict) -> MemoryObject:
+    obj = DictMemoryObject.__new__(DictMemoryObject)
+    obj.items = {
+        decode_id(key): decode_id(value) for key, value in dct["items"].items()
+    }
+    factory = dct.get("factory")
+    obj.factory = None if factory is None else decode_id(factory)
+    return obj
+
+
+def _decode_fields(dct: Dict) -> MemoryObject:
+    obj = FieldsMemoryObject.__new__(FieldsMemoryObject)
+    obj.fields = {name: decode_id(value) for name, value in dct["fields"].items()}
+    return obj
+
+
+def _decode_summary(dct: Dict) -> MemoryObject:
+    obj = SummaryMemoryObject.__new__(SummaryMemoryObject)
+    obj.length = dct["length"]
+    obj.fingerprint = None
+    return obj
+
+
+def _decode_reduce(dct: Dict) -> MemoryObject:
+    obj = ReduceMemoryObject.__new__(ReduceMemoryObject)
+    obj.constructor = get_typeinfo(
+        dct["constructor"]["module"], dct["constructor"]["kind"]
+    )
+    obj.args = decode_id(dct["args"])
+    obj.state = decode_id(dct["state"])
+    obj.listitems = decode_id(dct["listitems"])
+    obj.dictitems = decode_id(dct["dictitems"])
+    return obj
+
+
+MEMORY_OBJECT_DECODERS: Dict[str, Callable[[Dict], MemoryObject]] = {
+    "repr": _decode_repr,
+    "value": _decode_value,
+    "enum": _decode_enum,
+    "list": _decode_list,
+    "dict": _decode_dict,
+    "fields": _decode_fields,
+    "summary": _decode_summary,
+    "reduce": _decode_reduce,
+}
+
+
+def memory_object_from_dict(dct: Dict) -> MemoryObject:
+    """Create memory object from its JSON-compatible dict."""
+    decoder = MEMORY_OBJECT_DECODERS.get(dct["strategy"])
+    if decoder is None:
+        raise ValueError(f"Unknown strategy {dct['strategy']}")
+    obj = decoder(dct)
+    obj.id = decode_id(dct["id"])
+    typeinfo = dct["typeinfo"]
+    obj.typeinfo = get_typeinfo(typeinfo["module"], typeinfo["kind"])
+    obj.comparable = dct["comparable"]
+    return obj
 
 
 def as_repr_object(dct: Dict) -> Union[MemoryObject, Dict]:
-    if "strategy" in dct:
-        obj: MemoryObject
-        if dct["strategy"] == "repr":
-            obj = ReprMemoryObject.__new__(ReprMemoryObject)
-            obj.value = dct["value"]
-            obj.typeinfo = TypeInfo(
-                kind=dct["typeinfo"]["kind"], module=dct["typeinfo"]["module"]
-            )
-            obj.comparable = dct["comparable"]
-            return obj
-        if dct["strategy"] == "list":
-            obj = ListMemoryObject.__new__(ListMemoryObject)
-            obj.items = dct["items"]
-            obj.typeinfo = TypeInfo(
-                kind=dct["typeinfo"]["kind"], module=dct["typeinfo"]["module"]
-            )
-            obj.comparable = dct["comparable"]
-            return obj
-        if dct["strategy"] == "dict":
-            obj = DictMemoryObject.__new__(DictMemoryObject)
-            obj.items = dct["items"]
-            obj.typeinfo = TypeInfo(
-                kind=dct["typeinfo"]["kind"], module=dct["typeinfo"]["module"]
-            )
-            obj.comparable = dct["comparable"]
-            return obj
-        if dct["strategy"] == "reduce":
-            obj = ReduceMemoryObject.__new__(ReduceMemoryObject)
-            obj.constructor = TypeInfo(
-                kind=dct["constructor"]["kind"],
-                module=dct["constructor"]["module"],
-            )
-            obj.args = dct["args"]
-            obj.state = dct["state"]
-            obj.listitems = dct["listitems"]
-            obj.dictitems = dct["dictitems"]
-            obj.typeinfo = TypeInfo(
-                kind=dct["typeinfo"]["kind"], module=dct["typeinfo"]["module"]
-            )
-            obj.comparable = dct["comparable"]
-            return obj
+    # fields of objects are also JSON objects, but their values are ids
+    if "strategy" in dct and isinstance(dct.get("typeinfo"), dict):
+        return memory_object_from_dict(dct)
     return dct
 
 
+def _as_memory_object(obj: Union[MemoryObject, Dict]) -> MemoryObject:
+    if isinstance(obj, MemoryObject):  # decoded with `as_repr_object`
+        return obj
+    return memory_object_from_dict(obj)
+
+
+def as_memory_dump(parsed_data: Dict) -> MemoryDump:
+    """Create memory dump from decoded JSON object."""
+    with paused_gc():
+        return MemoryDump(
+            {
+                decode_id(id_): _as_memory_object(obj)
+                for id_, obj in parsed_data["objects"].items()
+            }
+        )
+
+
+def as_memory_delta(parsed_data: Dict) -> Tuple[MemoryDump, List[PythonId]]:
+    """Create memory delta from decoded JSON object."""
+    with paused_gc():
+        objects = {
+            decode_id(id_): _as_memory_object(obj)
+            for id_, obj in parsed_data.get("objects", {}).items()
+        }
+    return MemoryDump(objects), [decode_id(id_) for id_ in parsed_data.get("removed", [])]
+
+
+def serialize_memory_dump(memory_dump: MemoryDump) -> str:
+    with paused_gc():
+        return get_codec().dumps(memory_dump_to_dict(memory_dump))
+
+
 def deserialize_memory_objects(memory_dump: str) -> MemoryDump:
-    parsed_data = json.loads(memory_dump, object_hook=as_repr_object)
-    return MemoryDump(parsed_data["objects"])
+    with paused_gc():
+        return as_memory_dump(get_codec().loads(memory_dump))
+
+
+def deserialize_memory_delta(memory_delta: str) -> Tuple[MemoryDump, List[PythonId]]:
+    """Deserialize added or replaced objects and ids of removed objects."""
+    with paused_gc():
+        return as_memory_delta(get_codec().loads(memory_delta))
+
+
+def apply_memory_delta(
+    memory_dump: MemoryDump, delta: MemoryDump, removed: List[PythonId]
+) -> MemoryDump:
+    """Create a new dump, memory objects are shared with the original dump."""
+    objects = dict(memory_dump.objects)
+    objects.update(delta.objects)
+    for id_ in removed:
+        objects.pop(id_, None)
+    return MemoryDump(objects)
+
+
+IMMUTABLE_REPR_TYPES = {
+    "builtins.int",
+    "builtins.float",
+    "builtins.complex",
+    "builtins.bool",
+    "builtins.str",
+    "builtins.bytes",
+    "types.NoneType",
+}
+
+_NOT_CACHED = object()
 
 
 class DumpLoader:
-    def __init__(self, memory_dump: MemoryDump):
+    def __init__(self, memory_dump: MemoryDump, value_cache: Optional[LRUCache] = None):
         self.memory_dump = memory_dump
         self.memory: Dict[PythonId, object] = {}  # key is new id, value is real object
         self.dump_id_to_real_id: Dict[PythonId, PythonId] = {}
+        self.serializer = PythonSerializer()
+        self.value_cache = value_cache
+        self.cache_keys: Dict[PythonId, Optional[Hashable]] = {}
+
+    def get_cache_key(self, python_id: PythonId) -> Optional[Hashable]:
+        """Get key of immutable object in value cache or None for other objects."""
+        if python_id in self.cache_keys:
+            return self.cache_keys[python_id]
+        self.cache_keys[python_id] = None  # for recursive objects
+
+        dump_object = self.memory_dump.objects[python_id]
+        fullname = dump_object.typeinfo.fullname
+        key: Optional[Hashable] = None
+        if isinstance(dump_object, ReprMemoryObject):
+            if fullname in IMMUTABLE_REPR_TYPES:
+                key = fullname, dump_object.value
+        elif isinstance(dump_object, ValueMemoryObject):
+            key = fullname, dump_object.value
+        elif isinstance(dump_object, ListMemoryObject):
+            if fullname in ("builtins.tuple", "builtins.frozenset"):
+                items = tuple(self.get_cache_key(item) for item in dump_object.items)
+                if None not in items:
+                    key = fullname, items
+
+        self.cache_keys[python_id] = key
+        return key
 
     def reload_id(self) -> MemoryDump:
+        """Memory dump of the loaded objects with ids of the real objects.
+
+        Objects of the dump that were never loaded, e.g. objects of a stored base dump
+        unreachable from the arguments of the current request, are left out."""
         new_memory_objects: Dict[PythonId, MemoryObject] = {}
         for id_, obj in self.memory_dump.objects.items():
+            if id_ not in self.dump_id_to_real_id:
+                continue
             new_memory_object = copy.deepcopy(obj)
             read_id = self.dump_id_to_real_id[id_]
             new_memory_object.obj = self.memory[read_id]
-            if isinstance(new_memory_object, ReprMemoryObject):
+            new_memory_object.id = read_id
+            if isinstance(
+                new_memory_object,
+                (ReprMemoryObject, ValueMemoryObject, EnumMemoryObject, SummaryMemoryObject),
+            ):
                 pass
             elif isinstance(new_memory_object, ListMemoryObject):
                 new_memory_object.items = [
@@ -124,6 +342,15 @@ class DumpLoader:
                     self.dump_id_to_real_id[id_key]: self.dump_id_to_real_id[id_value]
                     for id_key, id_value in new_memory_object.items.items()
                 }
+                if new_memory_object.factory is not None:
+                    new_memory_object.factory = self.dump_id_to_real_id[
+                        new_memory_object.factory
+                    ]
+            elif isinstance(new_memory_object, FieldsMemoryObject):
+                new_memory_object.fields = {
+                    name: self.dump_id_to_real_id[id_value]
+                    for name, id_value in new_memory_object.fields.items()
+                }
             elif isinstance(new_memory_object, ReduceMemoryObject):
                 new_memory_object.args = self.dump_id_to_real_id[new_memory_object.args]
                 new_memory_object.state = self.dump_id_to_real_id[
@@ -151,39 +378,106 @@ class DumpLoader:
                 submodule_name = ".".join(module.split(".", maxsplit=i)[:i])
                 globals()[submodule_name] = importlib.import_module(submodule_name)
 
+    def register_object(self, python_id: PythonId, real_object: object) -> None:
+        """Map dump id to id of real_object in serializer."""
+        id_ = self.serializer.get_id(real_object)
+        self.dump_id_to_real_id[python_id] = id_
+        self.memory[id_] = real_object
+
+    def register_cached_object(self, python_id: PythonId, real_object: object) -> None:
+        """Register a value taken from the value cache together with its items.
+
+        Items of a cached tuple are the cached objects themselves, items of other
+        containers are loaded as usual."""
+        self.register_object(python_id, real_object)
+
+        dump_object = self.memory_dump.objects[python_id]
+        if isinstance(dump_object, ListMemoryObject):
+            if dump_object.typeinfo.fullname == "builtins.tuple":
+                for item_id, item in zip(dump_object.items, real_object):
+                    if item_id not in self.dump_id_to_real_id:
+                        self.register_cached_object(item_id, item)
+            else:
+                for item_id in dump_object.items:
+                    self.load_object(item_id)
+
     def load_object(self, python_id: PythonId) -> object:
         if python_id in self.dump_id_to_real_id:
             return self.memory[self.dump_id_to_real_id[python_id]]
 
+        cache_key = None
+        if self.value_cache is not None:
+            cache_key = self.get_cache_key(python_id)
+            if cache_key is not None:
+                real_object = self.value_cache.get(cache_key, _NOT_CACHED)
+                if real_object is not _NOT_CACHED:
+                    self.register_cached_object(python_id, real_object)
+                    return real_object
+
         dump_object = self.memory_dump.objects[python_id]
         real_object: object
         if isinstance(dump_object, ReprMemoryObject):
             real_object = eval(dump_object.value)
+        elif isinstance(dump_object, ValueMemoryObject):
+            real_object = load_value_repr(dump_object.typeinfo, dump_object.value)
+        elif isinstance(dump_object, EnumMemoryObject):
+            real_object = getattr(load_type(dump_object.typeinfo), dump_object.value)
         elif isinstance(dump_object, ListMemoryObject):
             if dump_object.typeinfo.fullname == "builtins.set":
                 real_object = set(self.load_object(item) for item in dump_object.items)
+            elif dump_object.typeinfo.fullname == "builtins.frozenset":
+                real_object = frozenset(
+                    self.load_object(item) for item in dump_object.items
+                )
             elif dump_object.typeinfo.fullname == "builtins.tuple":
                 real_object = tuple(
                     self.load_object(item) for item in dump_object.items
                 )
             else:
-                real_object = []
+                if dump_object.typeinfo.fullname == "collections.deque":
+                    real_object = collections.deque(maxlen=dump_object.maxlen)
+                else:
+                    real_object = []
 
-                id_ = PythonId(str(id(real_object)))
-                self.dump_id_to_real_id[python_id] = id_
-                self.memory[id_] = real_object
+                self.register_object(python_id, real_object)
 
                 for item in dump_object.items:
                     real_object.append(self.load_object(item))
         elif isinstance(dump_object, DictMemoryObject):
-            real_object = {}
+            if dump_object.typeinfo.fullname == "collections.OrderedDict":
+                real_object = collections.OrderedDict()
+            elif dump_object.typeinfo.fullname == "collections.Counter":
+                real_object = collections.Counter()
+            elif dump_object.typeinfo.fullname == "collections.defaultdict":
+                real_object = collections.defaultdict(
+                    self.load_object(dump_object.factory)
+                )
+            else:
+                real_object = {}
 
-            id_ = PythonId(str(id(real_object)))
-            self.dump_id_to_real_id[python_id] = id_
-            self.memory[id_] = real_object
+            self.register_object(python_id, real_object)
 
             for key, value in dump_object.items.items():
                 real_object[self.load_object(key)] = self.load_object(value)
+        elif isinstance(dump_object, FieldsMemoryObject):
+            obj_type = load_type(dump_object.typeinfo)
+            if issubclass(obj_type, tuple):
+                real_object = tuple.__new__(
+                    obj_type,
+                    [self.load_object(value) for value in dump_object.fields.values()],
+                )
+            else:
+                real_object = object.__new__(obj_type)
+
+                self.register_object(python_id, real_object)
+
+                set_fields(
+                    real_object,
+                    {
+                        name: self.load_object(value)
+                        for name, value in dump_object.fields.items()
+                    },
+                )
         elif isinstance(dump_object, ReduceMemoryObject):
             constructor = eval(dump_object.constructor.qualname)
             args = self.load_object(dump_object.args)
@@ -192,9 +486,7 @@ class DumpLoader:
             else:
                 real_object = constructor(*args)
 
-            id_ = PythonId(str(id(real_object)))
-            self.dump_id_to_real_id[python_id] = id_
-            self.memory[id_] = real_object
+            self.register_object(python_id, real_object)
 
             if args is not None:
                 state = self.load_object(dump_object.state)
@@ -224,12 +516,15 @@ class DumpLoader:
                 if isinstance(dictitems, Dict):
                     for key, dictitem in dictitems.items():
                         real_object[key] = dictitem
+        elif isinstance(dump_object, SummaryMemoryObject):
+            raise TypeError(f"Can not load truncated object {python_id}")
         else:
             raise TypeError(f"Invalid type {dump_object}")
 
-        id_ = PythonId(str(id(real_object)))
-        self.dump_id_to_real_id[python_id] = id_
-        self.memory[id_] = real_object
+        self.register_object(python_id, real_object)
+
+        if cache_key is not None:
+            self.value_cache.put(cache_key, real_object, sys.getsizeof(real_object))
 
         return real_object
 
@@ -256,4 +551,4 @@ def main():
             "builtins.type",
         ]
     )
-    print(loader.load_object("140239390887040"))
+    print(loader.load_object(decode_id("140239390887040")))
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import collections
+import contextlib
+import copy
 import inspect
 import logging
 import re
@@ -7,9 +10,9 @@ import sys
 import typing
 from itertools import zip_longest
 import pickle
-from typing import Any, Callable, Dict, List, Optional, Set, Type, Iterable
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Type, Iterable
 
-from utbot_executor.deep_serialization.config import PICKLE_PROTO
+from utbot_executor.deep_serialization.config import PICKLE_PROTO, SerializationLimits
 from utbot_executor.deep_serialization.utils import (
     PythonId,
     get_kind,
@@ -18,14 +21,54 @@ from utbot_executor.deep_serialization.utils import (
     get_repr,
     has_repr,
     TypeInfo,
+    get_typeinfo,
     get_constructor_kind,
     has_reduce_ex,
     get_constructor_info,
+    has_value_repr,
+    get_value_repr,
+    is_enum_member,
+    has_fields,
+    get_fields,
+    set_fields,
+    LIST_TYPES,
+    DICT_TYPES,
+    get_intern_key,
 )
 
 
+PRIMITIVE_TYPES = (type(None), bool, int, float, complex, str)
+CONTAINER_TYPES = LIST_TYPES + DICT_TYPES
+
+
+def _shallow_key(obj: object) -> object:
+    return obj if type(obj) in PRIMITIVE_TYPES else id(obj)
+
+
+def _shallow_fingerprint(obj: object) -> Optional[int]:
+    """Hash of items (or attributes) of the object, `None` if it has none.
+
+    Primitive items are hashed by value, other ones by identity, so changes
+    inside nested objects are not detected."""
+    try:
+        if isinstance(obj, DICT_TYPES):
+            contents = tuple(_shallow_key(part) for item in obj.items() for part in item)
+        elif isinstance(obj, LIST_TYPES):
+            contents = tuple(_shallow_key(item) for item in obj)
+        elif hasattr(obj, "__dict__"):
+            contents = tuple(_shallow_key(value) for value in vars(obj).values())
+        else:
+            return None
+        return hash(contents)
+    except Exception:
+        return None
+
+
 class MemoryObject:
+    __slots__ = ("id", "typeinfo", "comparable", "is_draft", "deserialized_obj", "obj")
+
     strategy: str
+    id: PythonId
     typeinfo: TypeInfo
     comparable: bool
     is_draft: bool
@@ -47,8 +90,8 @@ class MemoryObject:
     def initialize(self) -> None:
         self._initialize()
 
-    def id_value(self) -> str:
-        return str(id(self.obj))
+    def id_value(self) -> PythonId:
+        return self.id
 
     def __repr__(self) -> str:
         if hasattr(self, "obj"):
@@ -64,6 +107,8 @@ class MemoryObject:
 
 
 class ReprMemoryObject(MemoryObject):
+    __slots__ = ("value",)
+
     strategy: str = "repr"
     value: str
 
@@ -82,13 +127,52 @@ class ReprMemoryObject(MemoryObject):
         super()._initialize(deserialized_obj, comparable)
 
 
+class ValueMemoryObject(MemoryObject):
+    __slots__ = ("value",)
+
+    strategy: str = "value"
+    value: str
+
+    def __init__(self, value_object: object) -> None:
+        super().__init__(value_object)
+        self.value = get_value_repr(value_object)
+
+    def initialize(self) -> None:
+        try:
+            comparable = check_comparability(self.obj, self.obj)
+        except Exception:
+            comparable = False
+
+        super()._initialize(self.obj, comparable)
+
+
+class EnumMemoryObject(MemoryObject):
+    __slots__ = ("value",)
+
+    strategy: str = "enum"
+    value: str
+
+    def __init__(self, enum_object: object) -> None:
+        super().__init__(enum_object)
+        self.value = enum_object.name
+
+    def initialize(self) -> None:
+        super()._initialize(self.obj, True)
+
+
 class ListMemoryObject(MemoryObject):
+    __slots__ = ("items", "maxlen")
+
     strategy: str = "list"
-    items: List[PythonId] = []
+    items: List[PythonId]
+    maxlen: Optional[int]
 
     def __init__(self, list_object: object) -> None:
-        self.items: List[PythonId] = []
+        self.items = []
+        self.maxlen = None
         super().__init__(list_object)
+        if isinstance(list_object, collections.deque):
+            self.maxlen = list_object.maxlen
 
     def initialize(self) -> None:
         serializer = PythonSerializer()
@@ -105,6 +189,10 @@ class ListMemoryObject(MemoryObject):
             deserialized_obj = tuple(deserialized_obj)
         elif self.typeinfo.fullname == "builtins.set":
             deserialized_obj = set(deserialized_obj)
+        elif self.typeinfo.fullname == "builtins.frozenset":
+            deserialized_obj = frozenset(deserialized_obj)
+        elif self.typeinfo.fullname == "collections.deque":
+            deserialized_obj = collections.deque(deserialized_obj, self.maxlen)
 
         comparable = all(serializer.get_by_id(elem).comparable for elem in self.items)
 
@@ -117,11 +205,15 @@ class ListMemoryObject(MemoryObject):
 
 
 class DictMemoryObject(MemoryObject):
+    __slots__ = ("items", "factory")
+
     strategy: str = "dict"
-    items: Dict[PythonId, PythonId] = {}
+    items: Dict[PythonId, PythonId]
+    factory: Optional[PythonId]
 
     def __init__(self, dict_object: object) -> None:
-        self.items: Dict[PythonId, PythonId] = {}
+        self.items = {}
+        self.factory = None
         super().__init__(dict_object)
 
     def initialize(self) -> None:
@@ -130,6 +222,9 @@ class DictMemoryObject(MemoryObject):
         self.deserialized_obj = {}  # for recursive dicts
         self.comparable = False  # for recursive dicts
 
+        if isinstance(self.obj, collections.defaultdict):
+            self.factory = serializer.write_object_to_memory(self.obj.default_factory)
+
         for key, value in self.obj.items():
             key_id = serializer.write_object_to_memory(key)
             value_id = serializer.write_object_to_memory(value)
@@ -137,6 +232,15 @@ class DictMemoryObject(MemoryObject):
             self.deserialized_obj[serializer[key_id]] = serializer[value_id]
 
         deserialized_obj = self.deserialized_obj
+        if self.typeinfo.fullname == "collections.OrderedDict":
+            deserialized_obj = collections.OrderedDict(deserialized_obj)
+        elif self.typeinfo.fullname == "collections.Counter":
+            deserialized_obj = collections.Counter(deserialized_obj)
+        elif self.typeinfo.fullname == "collections.defaultdict":
+            deserialized_obj = collections.defaultdict(
+                serializer[self.factory], deserialized_obj
+            )
+
         equals_len = len(self.obj) == len(deserialized_obj)
         comparable = equals_len and all(
             serializer.get_by_id(value_id).comparable
@@ -151,7 +255,59 @@ class DictMemoryObject(MemoryObject):
         return f"{self.typeinfo.kind}{self.items}"
 
 
+class FieldsMemoryObject(MemoryObject):
+    __slots__ = ("fields",)
+
+    strategy: str = "fields"
+    fields: Dict[str, PythonId]
+
+    def __init__(self, fields_object: object) -> None:
+        self.fields = {}
+        super().__init__(fields_object)
+        obj_type = type(fields_object)
+        self.typeinfo = get_typeinfo(obj_type.__module__, obj_type.__qualname__)
+
+    def initialize(self) -> None:
+        serializer = PythonSerializer()
+        obj_type = type(self.obj)
+        is_tuple = isinstance(self.obj, tuple)
+        # for recursive objects
+        self.deserialized_obj = None if is_tuple else object.__new__(obj_type)
+        self.comparable = True  # for recursive objects
+
+        for name, value in get_fields(self.obj).items():
+            self.fields[name] = serializer.write_object_to_memory(value)
+
+        fields = {name: serializer[value_id] for name, value_id in self.fields.items()}
+        deserialized_obj = self.deserialized_obj
+        if is_tuple:
+            deserialized_obj = tuple.__new__(obj_type, fields.values())
+        else:
+            set_fields(deserialized_obj, fields)
+
+        try:
+            comparable = bool(self.obj == deserialized_obj)
+        except Exception:
+            comparable = False
+
+        super()._initialize(deserialized_obj, comparable)
+
+    def __repr__(self) -> str:
+        if hasattr(self, "obj"):
+            return str(self.obj)
+        return f"{self.typeinfo.kind}{self.fields}"
+
+
 class ReduceMemoryObject(MemoryObject):
+    __slots__ = (
+        "constructor",
+        "args",
+        "state",
+        "listitems",
+        "dictitems",
+        "reduce_value",
+    )
+
     strategy: str = "reduce"
     constructor: TypeInfo
     args: PythonId
@@ -159,7 +315,7 @@ class ReduceMemoryObject(MemoryObject):
     listitems: PythonId
     dictitems: PythonId
 
-    reduce_value: List[Any] = []
+    reduce_value: List[Any]
 
     def __init__(self, reduce_object: object) -> None:
         super().__init__(reduce_object)
@@ -187,7 +343,7 @@ class ReduceMemoryObject(MemoryObject):
             else:
                 if obj2 is not reduce_object:
                     self.comparable = False
-            typeinfo = TypeInfo(module_name, name)
+            typeinfo = get_typeinfo(module_name, name)
             self.constructor = typeinfo
             self.deserialized_obj = obj2
             self.reduce_value = []
@@ -328,6 +484,33 @@ class ReduceMemoryObject(MemoryObject):
         super()._initialize(deserialized_obj, comparable)
 
 
+class SummaryMemoryObject(MemoryObject):
+    __slots__ = ("length", "fingerprint")
+
+    strategy: str = "summary"
+    length: Optional[int]
+    fingerprint: Optional[int]
+
+    def __init__(self, summary_object: object) -> None:
+        super().__init__(summary_object)
+        try:
+            self.length = len(summary_object)
+        except Exception:
+            self.length = None
+        self.fingerprint = _shallow_fingerprint(summary_object)
+
+    def initialize(self) -> None:
+        super()._initialize(None, False)
+
+    def __deepcopy__(self, memo: Dict) -> SummaryMemoryObject:
+        # truncated objects are usually huge, keep the original object;
+        # its changes are detected by the fingerprint taken at serialization
+        return copy.copy(self)
+
+    def __repr__(self) -> str:
+        return f"{self.typeinfo.kind}(<{self.length} items>)"
+
+
 class MemoryObjectProvider(object):
     @staticmethod
     def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
@@ -337,7 +520,7 @@ class MemoryObjectProvider(object):
 class ListMemoryObjectProvider(MemoryObjectProvider):
     @staticmethod
     def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
-        if any(type(obj) == t for t in (list, set, tuple, frozenset)):
+        if any(type(obj) == t for t in LIST_TYPES):
             return ListMemoryObject
         return None
 
@@ -345,11 +528,35 @@ class ListMemoryObjectProvider(MemoryObjectProvider):
 class DictMemoryObjectProvider(MemoryObjectProvider):
     @staticmethod
     def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
-        if type(obj) == dict:
+        if any(type(obj) == t for t in DICT_TYPES):
             return DictMemoryObject
         return None
 
 
+class ValueMemoryObjectProvider(MemoryObjectProvider):
+    @staticmethod
+    def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
+        if has_value_repr(obj):
+            return ValueMemoryObject
+        return None
+
+
+class EnumMemoryObjectProvider(MemoryObjectProvider):
+    @staticmethod
+    def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
+        if is_enum_member(obj):
+            return EnumMemoryObject
+        return None
+
+
+class FieldsMemoryObjectProvider(MemoryObjectProvider):
+    @staticmethod
+    def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
+        if has_fields(obj):
+            return FieldsMemoryObject
+        return None
+
+
 class ReduceMemoryObjectProvider(MemoryObjectProvider):
     @staticmethod
     def get_serializer(obj: object) -> Optional[Type[MemoryObject]]:
@@ -382,6 +589,10 @@ class MemoryDump:
             objects = {}
         self.objects = objects
 
+    @property
+    def truncated(self) -> bool:
+        return any(isinstance(obj, SummaryMemoryObject) for obj in self.objects.values())
+
 
 class PythonSerializer:
     instance: PythonSerializer
@@ -390,9 +601,23 @@ class PythonSerializer:
 
     visited: Set[PythonId] = set()
 
+    # id(obj) -> object index in dump, indexed objects are kept alive until `clear`
+    ids: Dict[int, PythonId] = {}
+    indexed_objects: List[object] = []
+
+    limits: SerializationLimits = SerializationLimits()
+    depth: int = 0
+
+    intern_values: bool = False
+    interned: Dict[Hashable, PythonId] = {}
+    interned_aliases: Dict[PythonId, PythonId] = {}
+
     providers: List[MemoryObjectProvider] = [
         ListMemoryObjectProvider,
         DictMemoryObjectProvider,
+        ValueMemoryObjectProvider,
+        EnumMemoryObjectProvider,
+        FieldsMemoryObjectProvider,
         ReduceMemoryObjectProvider,
         ReprMemoryObjectProvider,
         ReduceExMemoryObjectProvider,
@@ -407,6 +632,18 @@ class PythonSerializer:
 
     def clear(self):
         self.memory = MemoryDump()
+        self.ids = {}
+        self.indexed_objects = []
+        self.interned = {}
+        self.interned_aliases = {}
+
+    def get_id(self, py_object: object) -> PythonId:
+        id_ = self.ids.get(id(py_object))
+        if id_ is None:
+            id_ = PythonId(len(self.indexed_objects))
+            self.ids[id(py_object)] = id_
+            self.indexed_objects.append(py_object)
+        return id_
 
     def get_by_id(self, id_: PythonId) -> MemoryObject:
         return self.memory.objects[id_]
@@ -417,21 +654,82 @@ class PythonSerializer:
     def clear_visited(self):
         self.visited.clear()
 
+    @contextlib.contextmanager
+    def with_options(self, limits: SerializationLimits, intern_values: bool = False):
+        old_options = self.limits, self.intern_values
+        self.limits, self.intern_values = limits, intern_values
+        try:
+            yield
+        finally:
+            self.limits, self.intern_values = old_options
+
+    def intern(self, id_: PythonId, py_object: object) -> PythonId:
+        """Return id of the first serialized object equal to immutable py_object."""
+        key = get_intern_key(py_object)
+        if key is None:
+            return id_
+        interned_id = self.interned.setdefault(key, id_)
+        if interned_id != id_:
+            self.interned_aliases[id_] = interned_id
+        return interned_id
+
+    def is_over_limits(self, py_object: object) -> bool:
+        limits = self.limits
+        if limits.max_objects is not None and len(self.visited) >= limits.max_objects:
+            return True
+        if (
+            limits.max_depth is not None
+            and self.depth > limits.max_depth
+            and type(py_object) not in PRIMITIVE_TYPES
+        ):
+            return True
+        if isinstance(py_object, CONTAINER_TYPES):
+            if (
+                limits.max_container_items is not None
+                and len(py_object) > limits.max_container_items
+            ):
+                return True
+            if (
+                limits.max_objects is not None
+                and len(self.visited) + len(py_object) >= limits.max_objects
+            ):
+                return True
+        return False
+
     def write_object_to_memory(self, py_object: object) -> PythonId:
         """Save serialized py_object to memory and return id."""
 
-        id_ = PythonId(str(id(py_object)))
+        id_ = self.get_id(py_object)
 
         if id_ in self.visited:
+            return self.interned_aliases.get(id_, id_)
+
+        if self.intern_values:
+            interned_id = self.intern(id_, py_object)
+            if interned_id != id_ and interned_id in self.memory.objects:
+                self.visited.add(id_)
+                return interned_id
+
+        if self.is_over_limits(py_object):
+            self.visited.add(id_)
+            mem_obj = SummaryMemoryObject(py_object)
+            mem_obj.id = id_
+            self.memory.objects[id_] = mem_obj
+            mem_obj.initialize()
             return id_
 
         for provider in self.providers:
             serializer = provider.get_serializer(py_object)
             if serializer is not None:
                 self.visited.add(id_)
-                mem_obj = serializer(py_object)
-                self.memory.objects[id_] = mem_obj
-                mem_obj.initialize()
+                self.depth += 1
+                try:
+                    mem_obj = serializer(py_object)
+                    mem_obj.id = id_
+                    self.memory.objects[id_] = mem_obj
+                    mem_obj.initialize()
+                finally:
+                    self.depth -= 1
                 return id_
 
         raise ValueError(f"Can not find provider for object {py_object}.")
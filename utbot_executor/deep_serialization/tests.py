@@ -1,18 +1,30 @@
 import collections
+import copy
 import dataclasses
 import datetime
+import decimal
+import enum
+import fractions
 import json
 import re
 import sys
 import typing
+import uuid
 
 import pytest
 
 from utbot_executor.deep_serialization import json_converter
+from utbot_executor.deep_serialization.cache import LRUCache
+from utbot_executor.deep_serialization.codec import CODECS, get_codec, set_codec
+from utbot_executor.deep_serialization.config import SerializationLimits
+from utbot_executor.deep_serialization.memory_objects import PythonSerializer
 from utbot_executor.deep_serialization.deep_serialization import (
     serialize_objects_dump,
     deserialize_objects,
+    warm_up,
+    _warm_up_objects,
 )
+from utbot_executor.deep_serialization.utils import decode_id
 
 
 def get_deserialized_obj(obj: typing.Any, imports: typing.List[str]):
@@ -184,11 +196,115 @@ def test_classes_with_slots(obj: typing.Any, imports: typing.List[str]):
     template_test_assert(obj, imports)
 
 
+@dataclasses.dataclass(frozen=True)
+class MyFrozenDataClass:
+    a: int
+    b: typing.Tuple[int, ...]
+
+
+class MySlotsClass:
+    __slots__ = ["a", "__b", "unset"]
+
+    def __init__(self, a: int, b: typing.List[int]):
+        self.a = a
+        self.__b = b
+
+    def __eq__(self, other):
+        if not isinstance(other, MySlotsClass):
+            return False
+        return self.a == other.a and self.__b == other.__b
+
+
+class MyChildSlotsClass(MySlotsClass):
+    __slots__ = "c"
+
+    def __init__(self, a: int, b: typing.List[int], c: str):
+        super().__init__(a, b)
+        self.c = c
+
+    def __eq__(self, other):
+        return super().__eq__(other) and self.c == other.c
+
+
+class MyNamedTuple(typing.NamedTuple):
+    a: int
+    b: typing.List[int]
+
+
+MyCollectionsNamedTuple = collections.namedtuple("MyCollectionsNamedTuple", "x y")
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        MyDataClass(1, "a", [1, 2], {"a": b"c"}),
+        MyFrozenDataClass(1, (2, 3)),
+        MySlotsClass(1, [2, 3]),
+        MyChildSlotsClass(1, [2, 3], "c"),
+        MyNamedTuple(1, [2, 3]),
+        MyCollectionsNamedTuple("x", MyNamedTuple(1, [])),
+    ],
+)
+def test_fields(obj: typing.Any):
+    serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
+    deserialized_data = json.loads(serialized_memory_dump)
+    serialized_obj = deserialized_data["objects"][serialized_obj_ids[0]]
+    assert serialized_obj["strategy"] == "fields"
+    assert serialized_obj["comparable"]
+
+    deserialized_obj = get_deserialized_obj(
+        obj, ["utbot_executor.deep_serialization.tests"]
+    )
+    assert obj == deserialized_obj
+    assert type(obj) == type(deserialized_obj)
+
+
+if sys.version_info >= (3, 10):
+
+    @dataclasses.dataclass(frozen=True, slots=True)
+    class MySlottedDataClass:
+        a: int
+        b: typing.Tuple[int, ...]
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 10),
+    reason="dataclasses.dataclass(slots=True) has been added in Python 3.10",
+)
+def test_fields_slotted_dataclass():
+    obj = MySlottedDataClass(1, (2, 3))
+    template_test_assert(obj, ["utbot_executor.deep_serialization.tests"])
+
+
+def test_fields_unset_slot():
+    deserialized_obj = get_deserialized_obj(
+        MySlotsClass(1, []), ["utbot_executor.deep_serialization.tests"]
+    )
+    assert not hasattr(deserialized_obj, "unset")
+
+
+@dataclasses.dataclass
+class TreeNode:
+    name: str
+    children: typing.List["TreeNode"]
+    parent: typing.Optional["TreeNode"] = None
+
+
+def test_fields_recursive():
+    root = TreeNode("root", [])
+    root.children.append(TreeNode("leaf", [], root))
+
+    deserialized_obj = get_deserialized_obj(
+        root, ["utbot_executor.deep_serialization.tests"]
+    )
+    assert deserialized_obj.children[0].parent is deserialized_obj
+
+
 def test_comparable():
     obj = EmptyClass()
     serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
     memory_dump = json_converter.deserialize_memory_objects(serialized_memory_dump)
-    assert memory_dump.objects[serialized_obj_ids[0]].comparable
+    assert memory_dump.objects[decode_id(serialized_obj_ids[0])].comparable
 
 
 class IncomparableClass:
@@ -199,7 +315,7 @@ def test_incomparable():
     obj = IncomparableClass()
     serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
     memory_dump = json_converter.deserialize_memory_objects(serialized_memory_dump)
-    assert not memory_dump.objects[serialized_obj_ids[0]].comparable
+    assert not memory_dump.objects[decode_id(serialized_obj_ids[0])].comparable
 
 
 def test_recursive_list():
@@ -208,7 +324,7 @@ def test_recursive_list():
 
     serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
     memory_dump = json_converter.deserialize_memory_objects(serialized_memory_dump)
-    assert not memory_dump.objects[serialized_obj_ids[0]].comparable
+    assert not memory_dump.objects[decode_id(serialized_obj_ids[0])].comparable
 
     deserialized_objs = deserialize_objects(
         serialized_obj_ids,
@@ -225,7 +341,7 @@ def test_recursive_dict():
 
     serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
     memory_dump = json_converter.deserialize_memory_objects(serialized_memory_dump)
-    assert not memory_dump.objects[serialized_obj_ids[0]].comparable
+    assert not memory_dump.objects[decode_id(serialized_obj_ids[0])].comparable
 
     deserialized_objs = deserialize_objects(
         serialized_obj_ids,
@@ -246,7 +362,7 @@ def test_deep_recursive_list():
 
     serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
     memory_dump = json_converter.deserialize_memory_objects(serialized_memory_dump)
-    assert not memory_dump.objects[serialized_obj_ids[0]].comparable
+    assert not memory_dump.objects[decode_id(serialized_obj_ids[0])].comparable
 
     deserialized_objs = deserialize_objects(
         serialized_obj_ids,
@@ -316,7 +432,13 @@ def test_collections(obj: typing.Any, imports: typing.List[str]):
         ({1, 2}, "list"),
         ((1, 2), "list"),
         ({1: 2}, "dict"),
-        (collections.Counter("faksjdf"), "reduce"),
+        (collections.Counter("faksjdf"), "dict"),
+        (collections.OrderedDict([(1, 2)]), "dict"),
+        (collections.deque([1, 2]), "list"),
+        (frozenset([1, 2]), "list"),
+        (datetime.date(2023, 6, 23), "value"),
+        (decimal.Decimal("1.10"), "value"),
+        (enum.Enum("Color", "RED").RED, "enum"),
     ],
 )
 def test_strategy(obj: typing.Any, strategy: str):
@@ -325,6 +447,73 @@ def test_strategy(obj: typing.Any, strategy: str):
     assert deserialized_data["objects"][serialized_obj_ids[0]]["strategy"] == strategy
 
 
+class Color(enum.Enum):
+    RED = 1
+    GREEN = 2
+
+
+class Permission(enum.IntFlag):
+    R = 4
+    W = 2
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        datetime.datetime(2023, 6, 23, 12, 30, 5, 123),
+        datetime.datetime(2023, 6, 23, tzinfo=datetime.timezone.utc),
+        datetime.datetime(
+            2023, 6, 23, tzinfo=datetime.timezone(datetime.timedelta(hours=3))
+        ),
+        datetime.date(2023, 6, 23),
+        datetime.time(12, 30, 5),
+        datetime.timedelta(days=-1, seconds=5, microseconds=7),
+        decimal.Decimal("-1.10"),
+        decimal.Decimal("Infinity"),
+        fractions.Fraction(3, 4),
+        uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        Color.GREEN,
+        Permission.R,
+        Permission.R | Permission.W,
+        frozenset([1, "a"]),
+        collections.deque([1, 2, 3], maxlen=5),
+        collections.OrderedDict([("b", 1), ("a", 2)]),
+        collections.Counter("abcababa"),
+        collections.defaultdict(list, {1: [2]}),
+        collections.defaultdict(None, {1: 2}),
+        [datetime.date(2023, 6, 23), {Color.RED: decimal.Decimal(1)}],
+    ],
+)
+def test_stdlib_values(obj: typing.Any):
+    deserialized_obj = get_deserialized_obj(
+        obj, ["utbot_executor.deep_serialization.tests"]
+    )
+    assert obj == deserialized_obj
+    assert type(obj) == type(deserialized_obj)
+
+
+def test_stdlib_values_keep_details():
+    obj = [
+        collections.deque([1, 2], maxlen=3),
+        collections.defaultdict(int),
+        datetime.datetime(2023, 6, 23, tzinfo=datetime.timezone.utc),
+    ]
+    deserialized_obj = get_deserialized_obj(obj, [])
+    assert deserialized_obj[0].maxlen == 3
+    assert deserialized_obj[1]["missing"] == 0
+    assert deserialized_obj[2].tzinfo == datetime.timezone.utc
+
+
+def test_stdlib_values_are_compact():
+    PythonSerializer().clear()
+    serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump(
+        [datetime.datetime(2023, 6, 23)], True
+    )
+    deserialized_data = json.loads(serialized_memory_dump)
+    assert len(deserialized_data["objects"]) == 1
+    assert deserialized_data["objects"][serialized_obj_ids[0]]["comparable"]
+
+
 @pytest.mark.parametrize(
     "obj,imports",
     [
@@ -373,3 +562,208 @@ def test_type_var_tuple():
 def test_type_var(obj: typing.Any, imports: typing.List[str]):
     deserialized_obj = get_deserialized_obj(obj, imports)
     assert deserialized_obj.__name__ == obj.__name__
+
+
+@pytest.mark.parametrize(
+    "obj,limits",
+    [
+        (list(range(100)), SerializationLimits(max_container_items=10)),
+        ({i: i for i in range(100)}, SerializationLimits(max_container_items=10)),
+        ([[[[1]]]], SerializationLimits(max_depth=2)),
+        ([[i] for i in range(100)], SerializationLimits(max_objects=10)),
+        (TreeNode("root", [TreeNode(str(i), []) for i in range(5)]), SerializationLimits(max_objects=10)),
+    ],
+)
+def test_limits(obj: typing.Any, limits: SerializationLimits):
+    serializer = PythonSerializer()
+    serializer.clear()
+    with serializer.with_options(limits):
+        serialized_obj_ids, memory, serialized_memory_dump = serialize_objects_dump(
+            [obj], True
+        )
+    assert memory.truncated
+    deserialized_data = json.loads(serialized_memory_dump)["objects"]
+    summaries = [o for o in deserialized_data.values() if o["strategy"] == "summary"]
+    assert summaries
+    assert all(not o["comparable"] for o in summaries)
+    assert not deserialized_data[serialized_obj_ids[0]]["comparable"]
+    if limits.max_objects is not None:
+        assert len(deserialized_data) <= 2 * limits.max_objects
+
+
+def test_limits_summary():
+    serializer = PythonSerializer()
+    serializer.clear()
+    with serializer.with_options(SerializationLimits(max_container_items=10)):
+        serialized_obj_ids, memory, serialized_memory_dump = serialize_objects_dump(
+            [list(range(100))], True
+        )
+    summary = json.loads(serialized_memory_dump)["objects"][serialized_obj_ids[0]]
+    assert summary["strategy"] == "summary"
+    assert summary["length"] == 100
+    assert summary["typeinfo"] == {"module": "builtins", "kind": "list"}
+    assert serializer.limits == SerializationLimits()
+
+
+def test_no_limits():
+    serializer = PythonSerializer()
+    serializer.clear()
+    _, memory, _ = serialize_objects_dump([list(range(100))], True)
+    assert not memory.truncated
+
+
+def test_intern_values():
+    serializer = PythonSerializer()
+    obj = [
+        "".join(["abc", "def"]),
+        "".join(["abc", "d", "ef"]),
+        float("1.5"),
+        float("1.5"),
+        10**30,
+        10**30 + 0,
+        tuple([1, (2, "x")]),
+        tuple([1, (2, "x")]),
+        0.0,
+        -0.0,
+    ]
+    assert obj[0] is not obj[1] and obj[6] is not obj[7]
+
+    serializer.clear()
+    _, _, dump_without_interning = serialize_objects_dump([obj], True)
+    serializer.clear()
+    with serializer.with_options(SerializationLimits(), intern_values=True):
+        serialized_obj_ids, _, dump = serialize_objects_dump([obj], True)
+
+    objects = json.loads(dump)["objects"]
+    items = objects[serialized_obj_ids[0]]["items"]
+    assert len(objects) < len(json.loads(dump_without_interning)["objects"])
+    assert items[0] == items[1]
+    assert items[2] == items[3]
+    assert items[4] == items[5]
+    assert items[6] == items[7]
+    assert items[8] != items[9]
+
+    deserialized_objs = deserialize_objects(serialized_obj_ids, dump, [])
+    assert deserialized_objs[serialized_obj_ids[0]] == obj
+
+
+def test_intern_values_keeps_identity():
+    serializer = PythonSerializer()
+    serializer.clear()
+    obj = [[1], [1], ([1],), ([1],)]
+    with serializer.with_options(SerializationLimits(), intern_values=True):
+        serialized_obj_ids, _, dump = serialize_objects_dump([obj], True)
+
+    items = json.loads(dump)["objects"][serialized_obj_ids[0]]["items"]
+    assert len(set(items)) == 4
+
+
+def test_sequential_ids():
+    serializer = PythonSerializer()
+    serializer.clear()
+    obj = [[1, "a"], (2.5, None)]
+    serialized_obj_ids, memory, dump = serialize_objects_dump([obj, obj[0]], True)
+
+    assert serialized_obj_ids == ['0', '1']
+    assert sorted(memory.objects) == list(range(len(memory.objects)))
+    assert all(id_ == str(o["id"]) for id_, o in json.loads(dump)["objects"].items())
+
+
+def test_shared_typeinfo():
+    serializer = PythonSerializer()
+    serializer.clear()
+    serialized_obj_ids, memory, dump = serialize_objects_dump([[1, 2], [3]], True)
+
+    typeinfos = {o.typeinfo.fullname: o.typeinfo for o in memory.objects.values()}
+    memory_dump = json_converter.deserialize_memory_objects(dump)
+    for obj in memory_dump.objects.values():
+        assert obj.typeinfo is typeinfos[obj.typeinfo.fullname]
+        assert not hasattr(obj, "__dict__")
+    assert copy.deepcopy(memory_dump).objects[0].typeinfo is typeinfos["builtins.list"]
+
+
+def test_lru_cache():
+    cache = LRUCache(2, 10)
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 4)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.size == 8
+    cache.put("d", 4, 11)
+    assert "d" not in cache
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_cache_on_evict():
+    evicted = []
+    cache = LRUCache(1, on_evict=evicted.append)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert evicted == [1]
+    cache.clear()
+    assert evicted == [1, 2]
+
+
+def test_value_cache():
+    obj = [("a b", 1.5, frozenset([1])), [1, 2], "c d"]
+    PythonSerializer().clear()
+    serialized_obj_ids, _, serialized_memory_dump = serialize_objects_dump([obj], True)
+    memory_dump = json_converter.deserialize_memory_objects(serialized_memory_dump)
+
+    value_cache = LRUCache(100)
+    first = json_converter.DumpLoader(memory_dump, value_cache).load_object(
+        decode_id(serialized_obj_ids[0])
+    )
+    second = json_converter.DumpLoader(memory_dump, value_cache).load_object(
+        decode_id(serialized_obj_ids[0])
+    )
+    assert first == second == obj
+    assert first[0] is second[0]
+    assert first[2] is second[2]
+    assert first is not second
+    assert first[1] is not second[1]
+    assert value_cache.hits >= 2
+
+
+@pytest.fixture(params=sorted(CODECS))
+def json_codec(request):
+    old_codec = get_codec()
+    yield set_codec(request.param)
+    set_codec(old_codec.name)
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        [1, 2.5, "a\"b", b"c", None, True, complex(1, 2)],
+        {"a": (1, 2), 3: frozenset({4}), (5,): collections.deque([6], 3)},
+        collections.defaultdict(list, {"x": [datetime.date(2023, 1, 2)]}),
+        MyDataClass(1, "\u044f", [1, 2], {"a": b"c"}),
+        MyNamedTuple(1, [2, 3]),
+        Color.RED,
+    ],
+)
+def test_codec_equivalence(json_codec, obj: typing.Any):
+    serializer = PythonSerializer()
+    serializer.clear()
+    serialized_obj_ids, memory, dump = serialize_objects_dump([obj], True)
+
+    assert json.loads(dump) == json_converter.memory_dump_to_dict(memory)
+    memory_dump = json_converter.deserialize_memory_objects(dump)
+    assert json_converter.memory_dump_to_dict(memory_dump) == json.loads(dump)
+
+    deserialized_objs = deserialize_objects(serialized_obj_ids, dump, [__name__])
+    assert deserialized_objs[serialized_obj_ids[0]] == obj
+
+
+def test_codec_object_hook(json_codec):
+    data = '{"a": [{"b": 1}, 2], "c": {"d": {}}}'
+    hooked = json_codec.loads(data, object_hook=lambda dct: ("hooked", sorted(dct)))
+    assert hooked == json.loads(data, object_hook=lambda dct: ("hooked", sorted(dct)))
+
+
+def test_warm_up():
+    assert warm_up() == _warm_up_objects()
+    assert not PythonSerializer().memory.objects
@@ -1,16 +1,33 @@
 from __future__ import annotations
+import collections
 import dataclasses
+import datetime
+import decimal
+import enum
+import fractions
+import functools
 import importlib
 import pickle
-from typing import NewType
+import uuid
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
 
-from utbot_executor.deep_serialization.config import PICKLE_PROTO
+from utbot_executor.deep_serialization.config import PICKLE_PROTO, PythonId
 
-PythonId = NewType("PythonId", str)
 
+def decode_id(id_: Union[str, int]) -> PythonId:
+    """Convert id from JSON string form."""
+    return PythonId(int(id_))
 
-@dataclasses.dataclass
+
+def encode_id(id_: Optional[PythonId]) -> Optional[str]:
+    """Convert id to JSON string form."""
+    return None if id_ is None else str(id_)
+
+
+@dataclasses.dataclass(frozen=True)
 class TypeInfo:
+    __slots__ = ("module", "kind")
+
     module: str
     kind: str
 
@@ -30,14 +47,31 @@ class TypeInfo:
     @staticmethod
     def from_str(representation: str) -> TypeInfo:
         if "." in representation:
-            return TypeInfo(
+            return get_typeinfo(
                 representation.rsplit(".", 1)[0], representation.rsplit(".", 1)[1]
             )
-        return TypeInfo("", representation)
+        return get_typeinfo("", representation)
 
     def __str__(self):
         return self.qualname
 
+    def __copy__(self) -> TypeInfo:
+        return self
+
+    def __deepcopy__(self, memo: Dict) -> TypeInfo:
+        return self
+
+
+_TYPEINFO_REGISTRY: Dict[Tuple[str, str], TypeInfo] = {}
+
+
+def get_typeinfo(module: str, kind: str) -> TypeInfo:
+    """Get the shared TypeInfo instance for module and kind."""
+    typeinfo = _TYPEINFO_REGISTRY.get((module, kind))
+    if typeinfo is None:
+        typeinfo = _TYPEINFO_REGISTRY[(module, kind)] = TypeInfo(module, kind)
+    return typeinfo
+
 
 def check_comparability(py_object: object, deserialized_py_object: object) -> bool:
     return py_object == deserialized_py_object
@@ -46,37 +80,37 @@ def check_comparability(py_object: object, deserialized_py_object: object) -> bo
 def get_kind(py_object: object) -> TypeInfo:
     """Get module and name of type"""
     if py_object is None:
-        return TypeInfo("types", "NoneType")
+        return get_typeinfo("types", "NoneType")
     if isinstance(py_object, type):
-        return TypeInfo(py_object.__module__, py_object.__qualname__)
+        return get_typeinfo(py_object.__module__, py_object.__qualname__)
     if callable(py_object):
-        return TypeInfo("typing", "Callable")
+        return get_typeinfo("typing", "Callable")
     module = type(py_object).__module__
     qualname = type(py_object).__qualname__
-    return TypeInfo(module, qualname)
+    return get_typeinfo(module, qualname)
 
 
 def get_constructor_kind(py_object: object) -> TypeInfo:
     """Get module and name of object"""
     if py_object is None:
-        return TypeInfo("types", "NoneType")
+        return get_typeinfo("types", "NoneType")
     if isinstance(py_object, type):
-        return TypeInfo(py_object.__module__, py_object.__qualname__)
+        return get_typeinfo(py_object.__module__, py_object.__qualname__)
     if callable(py_object):
-        return TypeInfo(py_object.__module__, py_object.__qualname__)
+        return get_typeinfo(py_object.__module__, py_object.__qualname__)
     module = type(py_object).__module__
     qualname = type(py_object).__qualname__
-    return TypeInfo(module, qualname)
+    return get_typeinfo(module, qualname)
 
 
 def get_constructor_info(constructor: object) -> TypeInfo:
     if constructor == object.__init__:
-        return TypeInfo("builtins", "object.__new__")
+        return get_typeinfo("builtins", "object.__new__")
     if constructor == object.__new__:
-        return TypeInfo("builtins", "object.__new__")
+        return get_typeinfo("builtins", "object.__new__")
     if constructor is None:
-        return TypeInfo("types", "NoneType")
-    return TypeInfo(constructor.__module__, constructor.__qualname__)
+        return get_typeinfo("types", "NoneType")
+    return get_typeinfo(constructor.__module__, constructor.__qualname__)
 
 
 def has_reduce(py_object: object) -> bool:
@@ -175,8 +209,179 @@ def has_repr(py_object: object) -> bool:
     return False
 
 
+def _timedelta_to_str(value: datetime.timedelta) -> str:
+    return f"{value.days},{value.seconds},{value.microseconds}"
+
+
+def _timedelta_from_str(value: str) -> datetime.timedelta:
+    days, seconds, microseconds = value.split(",")
+    return datetime.timedelta(
+        days=int(days), seconds=int(seconds), microseconds=int(microseconds)
+    )
+
+
+VALUE_SERIALIZERS: Dict[type, Callable[[object], str]] = {
+    datetime.datetime: datetime.datetime.isoformat,
+    datetime.date: datetime.date.isoformat,
+    datetime.time: datetime.time.isoformat,
+    datetime.timedelta: _timedelta_to_str,
+    decimal.Decimal: str,
+    fractions.Fraction: str,
+    uuid.UUID: str,
+}
+
+VALUE_DESERIALIZERS: Dict[str, Callable[[str], object]] = {
+    "datetime.datetime": datetime.datetime.fromisoformat,
+    "datetime.date": datetime.date.fromisoformat,
+    "datetime.time": datetime.time.fromisoformat,
+    "datetime.timedelta": _timedelta_from_str,
+    "decimal.Decimal": decimal.Decimal,
+    "fractions.Fraction": fractions.Fraction,
+    "uuid.UUID": uuid.UUID,
+}
+
+LIST_TYPES = (list, set, tuple, frozenset, collections.deque)
+DICT_TYPES = (dict, collections.OrderedDict, collections.Counter, collections.defaultdict)
+
+
+def _is_plain_timezone(tzinfo: Optional[datetime.tzinfo]) -> bool:
+    """Check that tzinfo survives `isoformat` -> `fromisoformat` round trip."""
+    if tzinfo is None:
+        return True
+    if type(tzinfo) is not datetime.timezone:
+        return False
+    offset = tzinfo.utcoffset(None)
+    return tzinfo.tzname(None) == datetime.timezone(offset).tzname(None)
+
+
+def has_value_repr(py_object: object) -> bool:
+    type_ = type(py_object)
+    if type_ not in VALUE_SERIALIZERS:
+        return False
+    if type_ is datetime.datetime or type_ is datetime.time:
+        return py_object.fold == 0 and _is_plain_timezone(py_object.tzinfo)
+    return True
+
+
+def get_value_repr(py_object: object) -> str:
+    return VALUE_SERIALIZERS[type(py_object)](py_object)
+
+
+def load_value_repr(typeinfo: TypeInfo, value: str) -> object:
+    return VALUE_DESERIALIZERS[typeinfo.fullname](value)
+
+
+def get_intern_key(py_object: object) -> Optional[Hashable]:
+    """Get key of immutable object value or None if object can not be interned."""
+    type_ = type(py_object)
+    if type_ in (int, str, bytes, bool):
+        return type_, py_object
+    if type_ in (float, complex):
+        # repr distinguishes 0.0 and -0.0 and makes nan equal to nan
+        return type_, repr(py_object)
+    if type_ in (tuple, frozenset):
+        keys = []
+        for item in py_object:
+            key = get_intern_key(item)
+            if key is None:
+                return None
+            keys.append(key)
+        return type_, tuple(keys) if type_ is tuple else frozenset(keys)
+    if has_value_repr(py_object):
+        return type_, get_value_repr(py_object)
+    return None
+
+
+def is_enum_member(py_object: object) -> bool:
+    if not isinstance(py_object, enum.Enum):
+        return False
+    name = py_object.name
+    return name is not None and getattr(type(py_object), name, None) is py_object
+
+
+TPFLAGS_HEAPTYPE = 1 << 9
+
+
+@functools.lru_cache(maxsize=1024)
+def get_slots(type_: type) -> List[str]:
+    slots = []
+    for cls in type_.__mro__:
+        cls_slots = cls.__dict__.get("__slots__", ())
+        if isinstance(cls_slots, str):
+            cls_slots = [cls_slots]
+        for slot in cls_slots:
+            if slot in ("__dict__", "__weakref__"):
+                continue
+            if slot.startswith("__") and not slot.endswith("__"):
+                slot = f"_{cls.__name__.lstrip('_')}{slot}"
+            slots.append(slot)
+    return slots
+
+
+def _is_dataclass_state_method(method: object) -> bool:
+    return getattr(method, "__name__", "") in ("_dataclass_getstate", "_dataclass_setstate")
+
+
+def _has_default_reduce(type_: type) -> bool:
+    if type_.__reduce_ex__ is not object.__reduce_ex__:
+        return False
+    if type_.__reduce__ is not object.__reduce__:
+        return False
+    for name in ("__getstate__", "__setstate__"):
+        method = getattr(type_, name, None)
+        if method is None or method is getattr(object, name, None):
+            continue
+        if not _is_dataclass_state_method(method):
+            return False
+    return True
+
+
+def has_fields(py_object: object) -> bool:
+    """Check that object can be rebuilt with `object.__new__` and its fields."""
+    type_ = type(py_object)
+    if isinstance(py_object, type) or type_.__module__ == "builtins":
+        return False
+    if not _has_default_reduce(type_):
+        return False
+    if isinstance(py_object, tuple):
+        return (
+            hasattr(type_, "_fields")
+            and hasattr(type_, "_make")
+            and not getattr(py_object, "__dict__", None)
+        )
+    if type_.__new__ is not object.__new__ or not type_.__flags__ & TPFLAGS_HEAPTYPE:
+        return False
+    if hasattr(py_object, "__dict__"):
+        return dataclasses.is_dataclass(type_) and not get_slots(type_)
+    return all("__slots__" in cls.__dict__ for cls in type_.__mro__[:-1])
+
+
+def get_fields(py_object: object) -> Dict[str, object]:
+    if isinstance(py_object, tuple):
+        return dict(zip(type(py_object)._fields, py_object))
+    fields = dict(getattr(py_object, "__dict__", {}))
+    for slot in get_slots(type(py_object)):
+        try:
+            fields[slot] = object.__getattribute__(py_object, slot)
+        except AttributeError:
+            pass
+    return fields
+
+
+def set_fields(py_object: object, fields: Dict[str, object]) -> None:
+    if hasattr(py_object, "__dict__"):
+        py_object.__dict__.update(fields)
+    else:
+        for name, value in fields.items():
+            object.__setattr__(py_object, name, value)
+
+
 def getattr_by_path(py_object: object, path: str) -> object:
     current_object = py_object
     for layer in path.split("."):
         current_object = getattr(current_object, layer)
     return current_object
+
+
+def load_type(typeinfo: TypeInfo) -> type:
+    return getattr_by_path(importlib.import_module(typeinfo.module), typeinfo.kind)
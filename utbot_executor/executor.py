@@ -1,27 +1,57 @@
 """Python code executor for UnitTestBot"""
+import collections
 import copy
+import functools
+import hashlib
 import importlib
 import inspect
 import logging
 import pathlib
 import socket
 import sys
+import threading
+import time
 import traceback
 import typing
-from typing import Any, Callable, Dict, Iterable, List, Tuple
-
-from utbot_executor.deep_serialization.deep_serialization import serialize_memory_dump, \
-    serialize_objects_dump
-from utbot_executor.deep_serialization.json_converter import DumpLoader, deserialize_memory_objects
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from utbot_executor.coverage import SATURATION_FUNCTIONS_ITEMS, CoverageBitmap, CoverageSaturation
+from utbot_executor.deep_serialization.cache import LRUCache
+from utbot_executor.deep_serialization.config import SerializationLimits
+from utbot_executor.deep_serialization.deep_serialization import warm_up, write_objects_to_memory
+from utbot_executor.deep_serialization.json_converter import (
+    DumpLoader,
+    apply_memory_delta,
+    as_memory_delta,
+    as_memory_dump,
+    deserialize_memory_delta,
+    deserialize_memory_objects,
+)
 from utbot_executor.deep_serialization.memory_objects import MemoryDump, PythonSerializer
-from utbot_executor.deep_serialization.utils import PythonId, getattr_by_path
+from utbot_executor.deep_serialization.utils import PythonId, decode_id, getattr_by_path
 from utbot_executor.memory_compressor import compress_memory
-from utbot_executor.parser import ExecutionRequest, ExecutionResponse, ExecutionFailResponse, ExecutionSuccessResponse
-from utbot_executor.ut_tracer import UtTracer
+from utbot_executor.metrics import NULL_TIMER, MetricsAccumulator, NullTimer, PhaseTimer, process_stats
+from utbot_executor.parser import ExecutionRequest, ExecutionResponse, ExecutionFailResponse, \
+    ExecutionSuccessResponse, LoadRequest, LoadResponse, MemoryHandleRequest, MemoryHandleResponse, \
+    StatResponse
+from utbot_executor.transport import socket_address
+from utbot_executor.ut_tracer import PureTracer, UtTracer
 from utbot_executor.utils import suppress_stdout as __suppress_stdout
+from utbot_executor.watchdog import ExecutionTimeout, MemoryBudget, MemoryLimitExceeded, Watchdog
 
 __all__ = ['PythonExecutor']
 
+DUMP_CACHE_ITEMS = 16
+DUMP_CACHE_SIZE = 2**28
+VALUE_CACHE_ITEMS = 100_000
+VALUE_CACHE_SIZE = 2**26
+MEMORY_HANDLES_ITEMS = 64
+MEMORY_HANDLES_SIZE = 2**30
+COVERAGE_SESSIONS_ITEMS = 1024
+COVERAGE_BITMAPS_ITEMS = 16
+TIMEOUT_GRACE_MS = 1000
+MEMORY_OBJECT_SIZE = 300  # approximate size of parsed memory object, bytes
+
 
 def _update_states(init_memory_dump: MemoryDump, state_before: MemoryDump) -> MemoryDump:
     for id_, obj in state_before.objects.items():
@@ -30,6 +60,25 @@ def _update_states(init_memory_dump: MemoryDump, state_before: MemoryDump) -> Me
     return init_memory_dump
 
 
+def _wants(fields: Optional[AbstractSet[str]], *names: str) -> bool:
+    """Check if any of response fields is requested, all fields are requested by default."""
+    return fields is None or not fields.isdisjoint(names)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_function_lines(function: Callable) -> Tuple[int, int]:
+    """Get first line and the line after the end of function source."""
+    sources, start = inspect.getsourcelines(function)
+    return start, start + len(sources)
+
+
+def _get_function_lines(function: Callable) -> Tuple[int, int]:
+    try:
+        return _cached_function_lines(function)
+    except TypeError:  # unhashable callable object
+        return _cached_function_lines.__wrapped__(function)
+
+
 def _load_objects(objs: List[Any]) -> MemoryDump:
     serializer = PythonSerializer()
     serializer.clear_visited()
@@ -39,9 +88,58 @@ def _load_objects(objs: List[Any]) -> MemoryDump:
 
 
 class PythonExecutor:
-    def __init__(self, coverage_hostname: str, coverage_port: int):
+    def __init__(
+            self,
+            coverage_hostname: str,
+            coverage_port: int,
+            serialization_limits: Optional[SerializationLimits] = None,
+            intern_values: bool = False,
+            dump_cache: Optional[LRUCache] = None,
+            value_cache: Optional[LRUCache] = None,
+            memory_handles: Optional[LRUCache] = None,
+            coverage_sessions: Optional[LRUCache] = None,
+            coverage_bitmap: Optional[str] = None,
+            coverage_bitmaps_items: int = COVERAGE_BITMAPS_ITEMS,
+            saturation_threshold: Optional[int] = None,
+            saturation_trace_every: int = 0,
+            saturation_functions_items: int = SATURATION_FUNCTIONS_ITEMS,
+            timeout_ms: Optional[int] = None,
+            timeout_grace_ms: int = TIMEOUT_GRACE_MS,
+            memory_limit: Optional[int] = None,
+            collect_metrics: bool = False,
+            ):
         self.coverage_hostname = coverage_hostname
         self.coverage_port = coverage_port
+        self.coverage_socket: Optional[socket.socket] = None
+        self.serialization_limits = serialization_limits or SerializationLimits()
+        self.intern_values = intern_values
+        if dump_cache is None:
+            dump_cache = LRUCache(DUMP_CACHE_ITEMS, DUMP_CACHE_SIZE)
+        if value_cache is None:
+            value_cache = LRUCache(VALUE_CACHE_ITEMS, VALUE_CACHE_SIZE)
+        if memory_handles is None:
+            memory_handles = LRUCache(MEMORY_HANDLES_ITEMS, MEMORY_HANDLES_SIZE)
+        self.dump_cache = dump_cache
+        self.value_cache = value_cache
+        if coverage_sessions is None:
+            coverage_sessions = LRUCache(COVERAGE_SESSIONS_ITEMS)
+        self.memory_handles = memory_handles
+        self.coverage_sessions = coverage_sessions
+        self.coverage_bitmap = coverage_bitmap
+        # mapped segments are closed when evicted
+        self.coverage_bitmaps = LRUCache(max(coverage_bitmaps_items, 1), on_evict=CoverageBitmap.close)
+        self.timeout_ms = timeout_ms
+        self.timeout_grace_ms = timeout_grace_ms
+        self.watchdog = Watchdog(grace=timeout_grace_ms / 1000)
+        self.memory_limit = memory_limit
+        self.memory_tracing_lock = threading.Lock()
+        self.metrics = MetricsAccumulator() if collect_metrics else None
+        self.statuses: collections.Counter = collections.Counter()
+        self.saturation = None
+        if saturation_threshold is not None:
+            self.saturation = CoverageSaturation(
+                saturation_threshold, saturation_trace_every, saturation_functions_items,
+            )
 
     @staticmethod
     def add_syspaths(syspaths: Iterable[str]):
@@ -62,11 +160,157 @@ class PythonExecutor:
                         logging.warning("Import submodule %s failed", submodule_name)
                 logging.debug("Submodule #%d: OK", i)
 
-    def run_function(self, request: ExecutionRequest) -> ExecutionResponse:
+    def load_memory_dump(self, serialized_memory: str) -> MemoryDump:
+        """Parse memory dump or take it from the cache of already parsed dumps.
+
+        Parsed dumps are never changed by `DumpLoader`, so they can be shared."""
+        key = hashlib.blake2b(serialized_memory.encode(), digest_size=16).digest()
+        memory_dump = self.dump_cache.get(key)
+        if memory_dump is None:
+            memory_dump = deserialize_memory_objects(serialized_memory)
+            self.dump_cache.put(key, memory_dump, len(serialized_memory))
+        return memory_dump
+
+    def get_memory_dump(self, request: ExecutionRequest) -> MemoryDump:
+        """Get memory dump of request arguments.
+
+        If request has memory handle, `serializedMemory` is a delta to the stored dump.
+        In protocol v2 `serializedMemory` is already decoded JSON object, it is decoded
+        together with the request, so it is never put into the dump cache."""
+        serialized_memory = request.serialized_memory
+        if request.memory_handle is None:
+            if isinstance(serialized_memory, str):
+                return self.load_memory_dump(serialized_memory)
+            return as_memory_dump(serialized_memory)
+        base_memory_dump = self.memory_handles.get(request.memory_handle)
+        if base_memory_dump is None:
+            raise KeyError(f"Unknown memory handle {request.memory_handle}")
+        if isinstance(serialized_memory, str):
+            delta, removed = deserialize_memory_delta(serialized_memory)
+        else:
+            delta, removed = as_memory_delta(serialized_memory)
+        return apply_memory_delta(base_memory_dump, delta, removed)
+
+    def store_memory(self, request: MemoryHandleRequest) -> ExecutionResponse:
+        try:
+            if isinstance(request.serialized_memory, str):
+                memory_dump = deserialize_memory_objects(request.serialized_memory)
+                size = len(request.serialized_memory)
+            else:
+                memory_dump = as_memory_dump(request.serialized_memory)
+                size = len(memory_dump.objects) * MEMORY_OBJECT_SIZE
+        except Exception as _:
+            logging.debug("Error \n%s", traceback.format_exc())
+            return ExecutionFailResponse("fail", traceback.format_exc())
+        self.memory_handles.put(request.handle, memory_dump, size)
+        logging.debug("Memory handle %s has been stored", request.handle)
+        return MemoryHandleResponse("success", request.handle)
+
+    def send_coverage_message(self, message: bytes) -> None:
+        """Send coverage datagram to `coverage_hostname:coverage_port` or to `unix:/path`.
+
+        The message is dropped if it cannot be sent at once: unlike UDP, a unix datagram
+        socket would block while the queue of the receiver is full."""
+        family, address = socket_address(self.coverage_hostname, self.coverage_port)
+        if self.coverage_socket is None:
+            self.coverage_socket = socket.socket(family, socket.SOCK_DGRAM)
+            self.coverage_socket.setblocking(False)
+        try:
+            self.coverage_socket.sendto(message, address)
+        except OSError as ex:  # including BlockingIOError
+            logging.debug("Coverage message is dropped: %s", ex)
+
+    def get_coverage_bitmap(self, name: str) -> CoverageBitmap:
+        bitmap = self.coverage_bitmaps.get(name)
+        if bitmap is None:
+            bitmap = CoverageBitmap(name)
+            self.coverage_bitmaps.put(name, bitmap)
+            logging.debug("Coverage bitmap %s has been mapped", name)
+        return bitmap
+
+    def release_memory(self, request: MemoryHandleRequest) -> ExecutionResponse:
+        if self.memory_handles.pop(request.handle) is None:
+            return ExecutionFailResponse("fail", f"Unknown memory handle {request.handle}")
+        logging.debug("Memory handle %s has been released", request.handle)
+        return MemoryHandleResponse("success", request.handle)
+
+    def load(self, request: LoadRequest) -> ExecutionResponse:
+        """Import modules, resolve functions and read their sources before execution requests."""
+        start = time.perf_counter_ns()
+        try:
+            self.add_syspaths(request.syspaths)
+            self.add_imports(request.imports)
+            for function_module, function_name in request.functions:
+                function = getattr_by_path(importlib.import_module(function_module), function_name)
+                _get_function_lines(function)
+            if request.warm_up_serializer:
+                warm_up()
+        except Exception as _:
+            logging.debug("Error \n%s", traceback.format_exc())
+            return ExecutionFailResponse("fail", traceback.format_exc())
+        logging.debug("Loaded %d functions", len(request.functions))
+        return LoadResponse("success", True, time.perf_counter_ns() - start)
+
+    def stats(self) -> StatResponse:
+        """Executor health: served requests, caches and process state."""
+        return StatResponse("success", {
+            "requests": sum(self.statuses.values()),
+            "statuses": dict(self.statuses),
+            "metrics": self.metrics.stats() if self.metrics is not None else None,
+            "caches": {
+                "dumps": self.dump_cache.stats(),
+                "values": self.value_cache.stats(),
+                "memoryHandles": self.memory_handles.stats(),
+                "coverageSessions": self.coverage_sessions.stats(),
+                "coverageBitmaps": self.coverage_bitmaps.stats(),
+            },
+            "process": process_stats(),
+        })
+
+    def close(self) -> None:
+        """Unmap coverage bitmaps, stop the watchdog and close the coverage socket."""
+        self.coverage_bitmaps.clear()
+        self.watchdog.close()
+        if self.coverage_socket is not None:
+            self.coverage_socket.close()
+            self.coverage_socket = None
+
+    def create_timer(
+            self,
+            request: ExecutionRequest,
+            start_ns: Optional[int] = None,
+            ) -> Union[PhaseTimer, NullTimer]:
+        """Create timer of request phases if metrics are requested or collected."""
+        if request.metrics or self.metrics is not None:
+            return PhaseTimer(start_ns)
+        return NULL_TIMER
+
+    def run_function(
+            self,
+            request: ExecutionRequest,
+            timer: Optional[Union[PhaseTimer, NullTimer]] = None,
+            ) -> ExecutionResponse:
+        if timer is None:
+            timer = self.create_timer(request)
+        response = self._run_function(request, timer)
+        self.statuses[response.status] += 1
+        if timer.enabled:
+            if self.metrics is not None:
+                self.metrics.add(timer)
+            if request.metrics and isinstance(response, ExecutionSuccessResponse):
+                response.metrics = timer.to_dict()
+        return response
+
+    def _run_function(
+            self,
+            request: ExecutionRequest,
+            timer: Union[PhaseTimer, NullTimer],
+            ) -> ExecutionResponse:
         logging.debug("Prepare to run function `%s`", request.function_name)
         try:
-            memory_dump = deserialize_memory_objects(request.serialized_memory)
-            loader = DumpLoader(memory_dump)
+            with timer.phase('loadMemory'):
+                memory_dump = self.get_memory_dump(request)
+                loader = DumpLoader(memory_dump, self.value_cache)
         except Exception as _:
             logging.debug("Error \n%s", traceback.format_exc())
             return ExecutionFailResponse("fail", traceback.format_exc())
@@ -75,10 +319,11 @@ class PythonExecutor:
         try:
             logging.debug("Imports: %s", request.imports)
             logging.debug("Syspaths: %s", request.syspaths)
-            self.add_syspaths(request.syspaths)
-            self.add_imports(request.imports)
-            loader.add_syspaths(request.syspaths)
-            loader.add_imports(request.imports)
+            with timer.phase('imports'):
+                self.add_syspaths(request.syspaths)
+                self.add_imports(request.imports)
+                loader.add_syspaths(request.syspaths)
+                loader.add_imports(request.imports)
         except Exception as _:
             logging.debug("Error \n%s", traceback.format_exc())
             return ExecutionFailResponse("fail", traceback.format_exc())
@@ -95,61 +340,121 @@ class PythonExecutor:
                         f"Invalid function path {request.function_module}.{request.function_name}"
                         )
             logging.debug("Function initialized")
-            args = [loader.load_object(PythonId(arg_id)) for arg_id in request.arguments_ids]
+            with timer.phase('loadArguments'):
+                args = [loader.load_object(decode_id(arg_id)) for arg_id in request.arguments_ids]
+                kwargs = {name: loader.load_object(decode_id(kwarg_id)) for name, kwarg_id in request.kwarguments_ids.items()}
             logging.debug("Arguments: %s", args)
-            kwargs = {name: loader.load_object(PythonId(kwarg_id)) for name, kwarg_id in request.kwarguments_ids.items()}
         except Exception as _:
             logging.debug("Error \n%s", traceback.format_exc())
             return ExecutionFailResponse("fail", traceback.format_exc())
         logging.debug("Arguments have been created")
 
+        limits = self.serialization_limits.override(request.serialization_limits)
+        intern_values = self.intern_values if request.intern_values is None else request.intern_values
         try:
-            state_before_memory = _load_objects(args + list(kwargs.values()))
-            init_state_before = _update_states(loader.reload_id(), state_before_memory)
-            serialized_state_init = serialize_memory_dump(init_state_before)
-
-            def _coverage_sender(info: typing.Tuple[str, int]):
-                if pathlib.Path(info[0]) == pathlib.Path(request.filepath):
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    logging.debug("Coverage message: %s:%d", request.coverage_id, info[1])
-                    logging.debug("Port: %d", self.coverage_port)
-                    message = bytes(f'{request.coverage_id}:{info[1]}', encoding='utf-8')
-                    sock.sendto(message, (self.coverage_hostname, self.coverage_port))
-                    logging.debug("ID: %s, Coverage: %s", request.coverage_id, info)
-
-            value = _run_calculate_function_value(
-                    function,
-                    args,
-                    kwargs,
-                    request.filepath,
-                    serialized_state_init,
-                    tracer=UtTracer(_coverage_sender)
-                    )
+            with PythonSerializer().with_options(limits, intern_values):
+                value = self._run_traced_function(request, function, args, kwargs, loader, timer)
         except Exception as _:
             logging.debug("Error \n%s", traceback.format_exc())
             return ExecutionFailResponse("fail", traceback.format_exc())
         logging.debug("Value have been calculated: %s", value)
         return value
 
+    def _run_traced_function(
+            self,
+            request: ExecutionRequest,
+            function: Callable,
+            args: List[Any],
+            kwargs: Dict[str, Any],
+            loader: DumpLoader,
+            timer: Union[PhaseTimer, NullTimer] = NULL_TIMER,
+            ) -> ExecutionResponse:
+        if _wants(request.fields, 'stateInit'):
+            with timer.phase('stateInit'):
+                state_before_memory = _load_objects(args + list(kwargs.values()))
+                init_state_before = _update_states(loader.reload_id(), state_before_memory)
+        else:
+            init_state_before = None
+
+        def _coverage_sender(info: typing.Tuple[str, int]):
+            if pathlib.Path(info[0]) == pathlib.Path(request.filepath):
+                logging.debug("Coverage message: %s:%d", request.coverage_id, info[1])
+                message = bytes(f'{request.coverage_id}:{info[1]}', encoding='utf-8')
+                self.send_coverage_message(message)
+                logging.debug("ID: %s, Coverage: %s", request.coverage_id, info)
+
+        coverage_bitmap = None
+        bitmap_name = request.coverage_bitmap or self.coverage_bitmap
+        if bitmap_name is not None:
+            coverage_bitmap = self.get_coverage_bitmap(bitmap_name)
+
+        session_coverage = None
+        if request.coverage_session is not None:
+            session_key = (request.coverage_session, request.function_module, request.function_name)
+            session_coverage = self.coverage_sessions.get(session_key)
+            if session_coverage is None:
+                session_coverage = set()
+                self.coverage_sessions.put(session_key, session_coverage)
+
+        function_key = (request.function_module, request.function_name)
+        if request.force_tracing or self.saturation is None or \
+                self.saturation.should_trace(function_key):
+            tracer = UtTracer(
+                _coverage_sender if coverage_bitmap is None else lambda info: None,
+                request.filepath,
+                request.path_hash_mode,
+                coverage_bitmap,
+                )
+        else:
+            logging.debug("Coverage of %s is saturated, run without tracing", function_key)
+            tracer = PureTracer()
+
+        timeout_ms = self.timeout_ms if request.timeout_ms is None else request.timeout_ms
+        memory_limit = self.memory_limit if request.memory_limit is None else request.memory_limit
+        response = _run_calculate_function_value(
+                function,
+                args,
+                kwargs,
+                request.filepath,
+                init_state_before,
+                tracer=tracer,
+                fields=request.fields,
+                session_coverage=session_coverage,
+                watchdog=self.watchdog.limit(timeout_ms / 1000 if timeout_ms is not None else None),
+                memory_budget=MemoryBudget(
+                    memory_limit, request.measure_memory_peak, lock=self.memory_tracing_lock,
+                    ),
+                timer=timer,
+                )
+        if self.saturation is not None and isinstance(tracer, UtTracer):
+            module_path = pathlib.PurePath(request.filepath)
+            self.saturation.update(
+                function_key,
+                (line for filename, line in tracer.counts if pathlib.PurePath(filename) == module_path),
+            )
+        response.coverage_encoding = request.coverage_encoding
+        return response
+
 
 def _serialize_state(
         args: List[Any],
         kwargs: Dict[str, Any],
         result: Any = None,
-        ) -> Tuple[List[PythonId], Dict[str, PythonId], PythonId, MemoryDump, str]:
+        snapshot: bool = True,
+        ) -> Tuple[List[PythonId], Dict[str, PythonId], PythonId, MemoryDump]:
     """Serialize objects from args, kwargs and result.
 
-    Returns: tuple of args ids, kwargs ids, result id and serialized memory."""
+    Returns: tuple of args ids, kwargs ids, result id and snapshot of memory
+    (serializer memory itself if `snapshot` is false)."""
 
     all_arguments = args + list(kwargs.values()) + [result]
 
-    ids, memory, serialized_memory = serialize_objects_dump(all_arguments, True)
+    ids, memory = write_objects_to_memory(all_arguments, True)
     return (
             ids[:len(args)],
             dict(zip(kwargs.keys(), ids[len(args):len(args)+len(kwargs)])),
             ids[-1],
-            copy.deepcopy(memory),
-            serialized_memory,
+            copy.deepcopy(memory) if snapshot else memory,
             )
 
 
@@ -158,55 +463,113 @@ def _run_calculate_function_value(
         args: List[Any],
         kwargs: Dict[str, Any],
         fullpath: str,
-        state_init: str,
-        tracer: UtTracer,
-    ) -> ExecutionResponse:
+        state_init: Optional[MemoryDump],
+        tracer: Union[UtTracer, PureTracer],
+        fields: Optional[AbstractSet[str]] = None,
+        session_coverage: Optional[Set[int]] = None,
+        watchdog: Optional[Watchdog] = None,
+        memory_budget: Optional[MemoryBudget] = None,
+        timer: Union[PhaseTimer, NullTimer] = NULL_TIMER,
+    ) -> ExecutionSuccessResponse:
     """ Calculate function evaluation result.
 
-    Return serialized data: status, coverage info, object ids and memory."""
-
-    _, _, _, state_before, serialized_state_before = _serialize_state(args, kwargs)
+    Return serialized data: status, coverage info, object ids and memory.
+    States which are not needed for requested `fields` are not serialized.
+    If `session_coverage` is given, only lines which are not in it are reported as
+    covered and missed lines are the ones not covered by the whole session; the set
+    is updated with the covered lines.
+    Coverage is not reported if function is run with `PureTracer`.
+    If `watchdog` interrupts the function, status is `timeout` and its result is
+    `ExecutionTimeout` exception, if `memory_budget` does, status is `memoryLimit`."""
+
+    if _wants(fields, 'stateBefore', 'diffIds'):
+        with timer.phase('stateBefore'):
+            _, _, _, state_before = _serialize_state(args, kwargs)
+    else:
+        state_before = None
 
     __is_exception = False
 
-    (__sources, __start, ) = inspect.getsourcelines(function)
-    __end = __start + len(__sources)
+    (__start, __end, ) = _get_function_lines(function)
 
     __tracer = tracer
+    __status = "success"
+    __memory_budget = memory_budget or MemoryBudget(None)
 
     try:
-        with __suppress_stdout():
+        with timer.phase('call'), __suppress_stdout(), watchdog or Watchdog(None), __memory_budget:
             __result = __tracer.runfunc(function, *args, **kwargs)
+    except ExecutionTimeout as __exception:
+        __result = __exception
+        __is_exception = True
+        __status = "timeout"
+    except MemoryLimitExceeded as __exception:
+        __result = __exception
+        __is_exception = True
+        __status = "memoryLimit"
     except Exception as __exception:
         __result = __exception
         __is_exception = True
     logging.debug("Function call finished: %s", __result)
 
-    logging.debug("Coverage: %s", __tracer.counts)
-    logging.debug("Fullpath: %s", fullpath)
-    module_path = pathlib.PurePath(fullpath)
-    __stmts = [x[1] for x in __tracer.counts if pathlib.PurePath(x[0]) == module_path]
-    __stmts_filtered = [x for x in range(__start, __end) if x in __stmts]
-    __stmts_filtered_with_def = [__start] + __stmts_filtered
-    __missed_filtered = [x for x in range(__start, __end) if x not in __stmts_filtered_with_def]
-    logging.debug("Covered lines: %s", __stmts_filtered_with_def)
-    logging.debug("Missed lines: %s", __missed_filtered)
-
-    args_ids, kwargs_ids, result_id, state_after, serialized_state_after = _serialize_state(args, kwargs, __result)
-    ids = args_ids + list(kwargs_ids.values())
-    # state_before, state_after = compress_memory(ids, state_before, state_after)
-    diff_ids = compress_memory(ids, state_before, state_after)
-
+    __stmts_filtered_with_def = None
+    __missed_filtered = None
+    __has_new_coverage = None
+    __coverage_skipped = isinstance(__tracer, PureTracer)
+    if (_wants(fields, 'statements', 'missedStatements') or session_coverage is not None) \
+            and not __coverage_skipped:
+        with timer.phase('coverage'):
+            logging.debug("Coverage: %s", __tracer.counts)
+            logging.debug("Fullpath: %s", fullpath)
+            module_path = pathlib.PurePath(fullpath)
+            __stmts = [x[1] for x in __tracer.counts if pathlib.PurePath(x[0]) == module_path]
+            __stmts_filtered = [x for x in range(__start, __end) if x in __stmts]
+            __stmts_filtered_with_def = [__start] + __stmts_filtered
+            __missed_filtered = [x for x in range(__start, __end) if x not in __stmts_filtered_with_def]
+            logging.debug("Covered lines: %s", __stmts_filtered_with_def)
+            logging.debug("Missed lines: %s", __missed_filtered)
+            if session_coverage is not None:
+                __stmts_filtered_with_def = [
+                    x for x in __stmts_filtered_with_def if x not in session_coverage
+                ]
+                session_coverage.update(__stmts_filtered_with_def)
+                __missed_filtered = [x for x in __missed_filtered if x not in session_coverage]
+                __has_new_coverage = bool(__stmts_filtered_with_def)
+                logging.debug("New lines: %s", __stmts_filtered_with_def)
+
+    args_ids, kwargs_ids, result_id, state_after, diff_ids = None, None, None, None, None
+    if _wants(fields, 'stateAfter', 'diffIds', 'argsIds', 'kwargsIds', 'resultId'):
+        with timer.phase('stateAfter'):
+            args_ids, kwargs_ids, result_id, state_after = _serialize_state(
+                    args, kwargs, __result, snapshot=_wants(fields, 'stateAfter')
+                    )
+    if _wants(fields, 'diffIds'):
+        with timer.phase('compress'):
+            ids = args_ids + list(kwargs_ids.values())
+            # state_before, state_after = compress_memory(ids, state_before, state_after)
+            diff_ids = compress_memory(ids, state_before, state_after)
+
+    if not _wants(fields, 'stateBefore'):
+        state_before = None
+    if not _wants(fields, 'stateAfter'):
+        state_after = None
     return ExecutionSuccessResponse(
-            status="success",
+            status=__status,
             is_exception=__is_exception,
-            statements=__stmts_filtered_with_def,
-            missed_statements=__missed_filtered,
+            statements=__stmts_filtered_with_def if _wants(fields, 'statements') else None,
+            missed_statements=__missed_filtered if _wants(fields, 'missedStatements') else None,
             state_init=state_init,
-            state_before=serialized_state_before,
-            state_after=serialized_state_after,
+            state_before=state_before,
+            state_after=state_after,
             diff_ids=diff_ids,
-            args_ids=args_ids,
-            kwargs_ids=kwargs_ids,
-            result_id=result_id,
+            args_ids=args_ids if _wants(fields, 'argsIds') else None,
+            kwargs_ids=kwargs_ids if _wants(fields, 'kwargsIds') else None,
+            result_id=result_id if _wants(fields, 'resultId') else None,
+            is_truncated=any(
+                state is not None and state.truncated for state in (state_init, state_before, state_after)
+                ),
+            has_new_coverage=__has_new_coverage,
+            path_hash=__tracer.path_hash.hexdigest() if __tracer.path_hash is not None else None,
+            coverage_skipped=__coverage_skipped,
+            memory_peak=__memory_budget.peak,
             )
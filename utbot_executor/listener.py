@@ -1,14 +1,46 @@
+import dataclasses
 import logging
+import math
 import os
-import socket
+import queue
+import threading
+import time
 import traceback
+from typing import Iterator, Optional, Tuple
 
 from utbot_executor.deep_serialization.memory_objects import PythonSerializer
-from utbot_executor.parser import parse_request, serialize_response, ExecutionFailResponse
+from utbot_executor.parser import parse_request, serialize_response, ExecutionFailResponse, \
+    ExecutionRequest, ExecutionResponse, ExecutionSuccessResponse, StatResponse, parse_memory_handle_request, \
+    iterencode_response, parse_load_request
 from utbot_executor.executor import PythonExecutor
+from utbot_executor.transport import SharedMemoryRing, connect, is_closed
 
 
 RECV_SIZE = 2**15
+CHUNK_SIZE = 2**16
+QUEUE_SIZE = 64
+
+MESSAGE_COMMANDS = (b'DATA', b'PIPE', b'LOAD', b'BASE', b'FREE')
+
+
+@dataclasses.dataclass
+class Frame:
+    command: bytes
+    body: bytes = b''
+    request_id: Optional[str] = None
+    receive_ns: int = 0
+    received_at_ns: Optional[int] = None
+    request: Optional[ExecutionRequest] = None
+    parse_error: Optional[str] = None
+    parse_ns: int = 0
+    queued_at_ns: int = 0
+
+
+@dataclasses.dataclass
+class OutgoingResponse:
+    response: ExecutionResponse
+    protocol_version: int = 1
+    request_id: Optional[str] = None
 
 
 class PythonExecuteServer:
@@ -18,71 +50,297 @@ class PythonExecuteServer:
             port: int,
             coverage_hostname: str,
             coverage_port: str,
+            queue_size: int = QUEUE_SIZE,
+            shared_memory_ring: Optional[str] = None,
+            **executor_options,
             ):
+        """Connect to `hostname:port` or to `unix:/path` (then `port` is ignored).
+
+        With `shared_memory_ring` message bodies are transferred through the shared memory
+        segment, the socket carries only commands, request ids and sizes."""
         logging.info('PythonExecutor is creating...')
-        self.clientsocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.clientsocket.connect((hostname, port))
-        self.executor = PythonExecutor(coverage_hostname, coverage_port)
+        self.clientsocket = connect(hostname, port)
+        self.ring = None
+        if shared_memory_ring is not None:
+            self.ring = SharedMemoryRing(shared_memory_ring, lambda: is_closed(self.clientsocket))
+        self.executor = PythonExecutor(coverage_hostname, coverage_port, **executor_options)
+        self.frames: queue.PriorityQueue = queue.PriorityQueue(queue_size)
+        self.epoch = 0
+        self.sequence = 0
+        self.responses: queue.Queue = queue.Queue(queue_size)
 
     def run(self) -> None:
+        """Execute requests in this thread, receive and send messages in background threads."""
         logging.info('PythonExecutor is ready...')
+        receiver = threading.Thread(target=self.receiver, daemon=True)
+        receiver.start()
+        sender = threading.Thread(target=self.sender, daemon=True)
+        sender.start()
         try:
             self.handler()
         finally:
+            self.responses.put(None)
+            sender.join()
+            self.executor.close()
             self.clientsocket.close()
+            if self.ring is not None:
+                self.ring.close()
+
+    def receiver(self) -> None:
+        """Receive and parse frames into the bounded queue while the handler executes requests.
+
+        If the queue is full, frames are left in the socket buffer."""
+        try:
+            while True:
+                frame = self.receive_frame()
+                self.enqueue(frame)
+                if frame.command == b'STOP':
+                    return
+        except Exception as ex:
+            logging.debug('Receiver stopped: %s', traceback.format_exc())
+            self.enqueue(Frame(b'STOP'))
+
+    def enqueue(self, frame: Frame) -> None:
+        """Put frame into the queue in the order of handling.
+
+        `PIPE` requests are handled by descending priority, then in the order of receiving.
+        Other commands (including `DATA`, whose responses have no ids) are barriers: they are
+        handled after all previously received frames and before all following ones."""
+        if frame.command == b'PIPE':
+            rank = -frame.request.priority if frame.request is not None else 0
+        else:
+            rank = math.inf
+        self.sequence += 1
+        frame.queued_at_ns = time.perf_counter_ns()
+        self.frames.put((self.epoch, rank, self.sequence, frame))
+        if frame.command != b'PIPE':
+            self.epoch += 1
+
+    def receive_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            message = self.clientsocket.recv(size - len(data))
+            if not message:
+                raise ConnectionError('Connection closed')
+            data += message
+        return bytes(data)
+
+    def receive_frame(self) -> Frame:
+        """Receive a frame and parse its request.
+
+        The request is parsed under the memory tracing lock, so it is not counted
+        in a memory budget of the running execution; the socket and the ring are
+        never waited for under the lock."""
+        command = self.receive_exactly(4)
+        frame = Frame(command)
+        if command == b'PIPE':
+            frame.request_id = self.receive_exactly(16).decode().strip()
+        if command in MESSAGE_COMMANDS:
+            start = frame.received_at_ns = time.perf_counter_ns()
+            frame.body = self.receive_message()
+            frame.receive_ns = time.perf_counter_ns() - start
+        if command in (b'DATA', b'PIPE'):
+            with self.executor.memory_tracing_lock:
+                start = time.perf_counter_ns()
+                try:
+                    frame.request = parse_request(frame.body)
+                except Exception as ex:
+                    logging.debug('Exception: %s', traceback.format_exc())
+                    frame.parse_error = traceback.format_exc()
+                frame.parse_ns = time.perf_counter_ns() - start
+        return frame
+
+    def sender(self) -> None:
+        """Encode and send responses from the bounded queue until `None`."""
+        while True:
+            outgoing = self.responses.get()
+            if outgoing is None:
+                return
+            start = time.perf_counter_ns()
+            try:
+                self.send_response(outgoing.response, outgoing.protocol_version, outgoing.request_id)
+            except Exception as ex:
+                logging.debug('Sending failed: %s', traceback.format_exc())
+            if self.executor.metrics is not None:
+                self.executor.metrics.add_phase('send', time.perf_counter_ns() - start)
+
+    def receive_message(self) -> bytes:
+        message_size = int(self.receive_exactly(16).decode())
+        logging.debug('Got message size: %d bytes', message_size)
+        if self.ring is not None:
+            return self.ring.incoming.read(message_size)
+        message_body = bytearray()
+
+        while len(message_body) < message_size:
+            message = self.clientsocket.recv(
+                    min(RECV_SIZE, message_size - len(message_body))
+                    )
+            message_body += message
+            logging.debug('Message: %s, size: %d', message, len(message))
+            logging.debug(
+                'Update content, current size: %d / %d bytes',
+                len(message_body),
+                message_size,
+            )
+        return bytes(message_body)
+
+    def send_chunk(self, data: bytes) -> None:
+        if self.ring is not None:
+            self.clientsocket.sendall(str(len(data)).encode() + os.linesep.encode())
+            self.ring.outgoing.write(data)
+            return
+        self.clientsocket.sendall(str(len(data)).encode() + os.linesep.encode() + data)
+
+    def encode_chunks(self, response: ExecutionResponse, protocol_version: int) -> Iterator[bytes]:
+        """Encode response into chunks of at least `CHUNK_SIZE` bytes (except the last one).
+
+        Each chunk is encoded under the memory tracing lock, which is released while
+        the chunk is sent."""
+        parts = iterencode_response(response, protocol_version)
+        while True:
+            with self.executor.memory_tracing_lock:
+                buffer = []
+                buffer_size = 0
+                for part in parts:
+                    buffer.append(part)
+                    buffer_size += len(part)
+                    if buffer_size >= CHUNK_SIZE:
+                        break
+                if not buffer:
+                    return
+                chunk = ''.join(buffer).encode()
+            yield chunk
+
+    def send_chunked_response(self, response: ExecutionResponse, protocol_version: int) -> None:
+        """Send response by chunks while it is being encoded.
+
+        Each chunk is its size, line separator and data; empty chunk ends the response.
+        Chunk with size -1 discards all previous chunks of the response."""
+        try:
+            for chunk in self.encode_chunks(response, protocol_version):
+                self.send_chunk(chunk)
+        except Exception as ex:
+            logging.debug('Exception: %s', traceback.format_exc())
+            self.clientsocket.sendall(b'-1' + os.linesep.encode())
+            self.send_chunk(serialize_response(ExecutionFailResponse('fail', '')).encode())
+        self.send_chunk(b'')
+
+        logging.debug('Sent all data')
+
+    def send_response(
+            self,
+            response: ExecutionResponse,
+            protocol_version: int = 1,
+            request_id: Optional[str] = None,
+            ) -> None:
+        logging.debug('Response: %s', response)
+        if request_id is not None:
+            self.clientsocket.sendall(request_id.encode() + os.linesep.encode())
+        if protocol_version >= 2:
+            self.send_chunked_response(response, protocol_version)
+            return
+
+        with self.executor.memory_tracing_lock:
+            try:
+                serialized_response = serialize_response(response)
+            except Exception as ex:
+                serialized_response = serialize_response(ExecutionFailResponse('fail', ''))
+
+            logging.debug('Serialized response: %s', serialized_response)
+
+            bytes_data = serialized_response.encode()
+        logging.debug('Encoded response: %s', bytes_data)
+        response_size = str(len(bytes_data))
+        self.clientsocket.send((response_size + os.linesep).encode())
+        if self.ring is not None:
+            self.ring.outgoing.write(bytes_data)
+            logging.debug('Sent all data')
+            return
+
+        sended_size = 0
+        while len(bytes_data) > sended_size:
+            sended_size += self.clientsocket.send(bytes_data[sended_size:])
+
+        logging.debug('Sent all data')
+
+    def execute(self, frame: Frame) -> Tuple[ExecutionResponse, int]:
+        """Run execution request from `DATA` or `PIPE` frame.
+
+        Returns response and protocol version of the request. Responses do not refer
+        to the serializer memory, so it is cleared before the response is sent.
+        A request which waited in the queue longer than its deadline is not executed,
+        its status is `expired`."""
+        request = frame.request
+        if request is None:
+            self.executor.statuses['fail'] += 1
+            return ExecutionFailResponse('fail', frame.parse_error), 1
+        logging.debug('Parsed request: %s', request)
+        queue_wait_ns = time.perf_counter_ns() - frame.queued_at_ns
+        if request.deadline_ms is not None and queue_wait_ns > request.deadline_ms * 1_000_000:
+            self.executor.statuses['expired'] += 1
+            return ExecutionFailResponse(
+                'expired',
+                f'Deadline {request.deadline_ms} ms passed, waited {queue_wait_ns // 1_000_000} ms in the queue',
+            ), request.protocol_version
+        try:
+            timer = self.executor.create_timer(request, frame.received_at_ns)
+            timer.add('receive', frame.receive_ns)
+            timer.add('parse', frame.parse_ns)
+            timer.add('queue', queue_wait_ns)
+            response = self.executor.run_function(request, timer)
+            if isinstance(response, ExecutionSuccessResponse):
+                response.queue_wait_ns = queue_wait_ns
+        except Exception as ex:
+            logging.debug('Exception: %s', traceback.format_exc())
+            response = ExecutionFailResponse('fail', traceback.format_exc())
+            self.executor.statuses[response.status] += 1
+        finally:
+            PythonSerializer().clear()
+        return response, request.protocol_version
+
+    def send_response_later(
+            self,
+            response: ExecutionResponse,
+            protocol_version: int = 1,
+            request_id: Optional[str] = None,
+            ) -> None:
+        self.responses.put(OutgoingResponse(response, protocol_version, request_id))
 
     def handler(self) -> None:
         logging.info('Start working...')
 
         while True:
-            command = self.clientsocket.recv(4)
+            _, _, _, frame = self.frames.get()
+            command = frame.command
+            message_body = frame.body
 
             if command == b'STOP':
                 break
-            if command == b'DATA':
-                message_size = int(self.clientsocket.recv(16).decode())
-                logging.debug('Got message size: %d bytes', message_size)
-                message_body = bytearray()
-
-                while len(message_body) < message_size:
-                    message = self.clientsocket.recv(
-                            min(RECV_SIZE, message_size - len(message_body))
-                            )
-                    message_body += message
-                    logging.debug('Message: %s, size: %d', message, len(message))
-                    logging.debug(
-                        'Update content, current size: %d / %d bytes',
-                        len(message_body),
-                        message_size,
-                    )
-
+            if command in (b'DATA', b'PIPE'):
+                response, protocol_version = self.execute(frame)
+                self.send_response_later(response, protocol_version, frame.request_id)
+            if command == b'LOAD':
                 try:
-                    request = parse_request(message_body.decode())
-                    logging.debug('Parsed request: %s', request)
-                    response = self.executor.run_function(request)
+                    response = self.executor.load(parse_load_request(message_body))
                 except Exception as ex:
                     logging.debug('Exception: %s', traceback.format_exc())
                     response = ExecutionFailResponse('fail', traceback.format_exc())
 
-                logging.debug('Response: %s', response)
-
+                self.send_response_later(response)
+            if command == b'PING':
+                self.send_response_later(StatResponse('success'))
+            if command == b'STAT':
+                self.send_response_later(self.executor.stats())
+            if command in (b'BASE', b'FREE'):
                 try:
-                    serialized_response = serialize_response(response)
+                    request = parse_memory_handle_request(message_body)
+                    if command == b'BASE':
+                        response = self.executor.store_memory(request)
+                    else:
+                        response = self.executor.release_memory(request)
                 except Exception as ex:
-                    serialized_response = serialize_response(ExecutionFailResponse('fail', ''))
-                finally:
-                    PythonSerializer().clear()
-
-                logging.debug('Serialized response: %s', serialized_response)
-
-                bytes_data = serialized_response.encode()
-                logging.debug('Encoded response: %s', bytes_data)
-                response_size = str(len(bytes_data))
-                self.clientsocket.send((response_size + os.linesep).encode())
-
-                sended_size = 0
-                while len(bytes_data) > sended_size:
-                    sended_size += self.clientsocket.send(bytes_data[sended_size:])
+                    logging.debug('Exception: %s', traceback.format_exc())
+                    response = ExecutionFailResponse('fail', traceback.format_exc())
 
-                logging.debug('Sent all data')
+                self.send_response_later(response)
         logging.info('All done...')
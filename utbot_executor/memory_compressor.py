@@ -1,6 +1,6 @@
 import typing
 
-from utbot_executor.deep_serialization.memory_objects import MemoryDump
+from utbot_executor.deep_serialization.memory_objects import MemoryDump, SummaryMemoryObject
 from utbot_executor.deep_serialization.utils import PythonId
 
 
@@ -12,6 +12,11 @@ def compress_memory(
     diff_ids: typing.List[PythonId] = []
     for id_ in ids:
         if id_ in state_before.objects and id_ in state_after.objects:
-            if state_before.objects[id_].obj != state_after.objects[id_].obj:
+            before, after = state_before.objects[id_], state_after.objects[id_]
+            if isinstance(before, SummaryMemoryObject) and isinstance(after, SummaryMemoryObject):
+                # both states refer to the same truncated object, compare its snapshots
+                if before.fingerprint != after.fingerprint:
+                    diff_ids.append(id_)
+            elif before.obj != after.obj:
                 diff_ids.append(id_)
     return diff_ids
@@ -0,0 +1,148 @@
+"""Timings and resource usage of request phases."""
+import collections
+import contextlib
+import gc
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_RSS_UNIT_KB = 1 / 1024 if sys.platform == 'darwin' else 1  # ru_maxrss is in bytes on macOS
+
+
+def _rusage() -> Any:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+
+class PhaseTimer:
+    """Durations of request phases, CPU time and maximum RSS growth of the process.
+
+    Total time is measured from `start` (`perf_counter_ns`, now by default), so phases
+    which happened before the timer was created must not start earlier than it."""
+
+    enabled = True
+
+    def __init__(self, start: Optional[int] = None):
+        self.phases: Dict[str, int] = {}
+        self.start = time.perf_counter_ns() if start is None else start
+        self.start_usage = _rusage()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def add(self, name: str, duration_ns: int) -> None:
+        self.phases[name] = self.phases.get(name, 0) + duration_ns
+
+    def to_dict(self) -> Dict[str, Any]:
+        metrics: Dict[str, Any] = {
+            'phasesNs': dict(self.phases),
+            'totalNs': time.perf_counter_ns() - self.start,
+        }
+        usage = _rusage()
+        if usage is not None:
+            cpu_time = usage.ru_utime + usage.ru_stime
+            start_cpu_time = self.start_usage.ru_utime + self.start_usage.ru_stime
+            metrics['cpuTimeNs'] = int((cpu_time - start_cpu_time) * 1e9)
+            metrics['maxRssDeltaKb'] = int(
+                (usage.ru_maxrss - self.start_usage.ru_maxrss) * _RSS_UNIT_KB
+            )
+        return metrics
+
+
+class NullTimer:
+    """Timer which measures nothing, used when metrics are disabled."""
+
+    enabled = False
+    phases: Dict[str, int] = {}
+
+    _null_context = contextlib.nullcontext()
+
+    def phase(self, name: str) -> contextlib.nullcontext:
+        return self._null_context
+
+    def add(self, name: str, duration_ns: int) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class MetricsAccumulator:
+    """Total durations of request phases and their histograms since the executor start.
+
+    Histogram buckets are powers of two microseconds, bucket `n` counts durations
+    up to `n` microseconds which are longer than the previous bucket."""
+
+    def __init__(self):
+        self.requests = 0
+        self.phases_ns: collections.Counter = collections.Counter()
+        self.histograms: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        self.lock = threading.Lock()  # phases are added by executing and sending threads
+
+    def add(self, timer: PhaseTimer) -> None:
+        with self.lock:
+            self.requests += 1
+            for name, duration_ns in timer.phases.items():
+                self._add_phase(name, duration_ns)
+            self._add_histogram('total', time.perf_counter_ns() - timer.start)
+
+    def add_phase(self, name: str, duration_ns: int) -> None:
+        with self.lock:
+            self._add_phase(name, duration_ns)
+
+    def _add_phase(self, name: str, duration_ns: int) -> None:
+        self.phases_ns[name] += duration_ns
+        self._add_histogram(name, duration_ns)
+
+    def _add_histogram(self, name: str, duration_ns: int) -> None:
+        duration_us = -(-duration_ns // 1000)
+        self.histograms[name][1 << max(duration_us - 1, 0).bit_length()] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'phasesNs': dict(self.phases_ns),
+                'histogramsUs': {
+                    name: {str(bucket): count for bucket, count in sorted(histogram.items())}
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+def _rss_kb() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def process_stats() -> Dict[str, Any]:
+    """Memory usage, garbage collector counters and size of the import state of the process."""
+    stats: Dict[str, Any] = {
+        'gcCounts': list(gc.get_count()),
+        'gcCollections': [generation['collections'] for generation in gc.get_stats()],
+        'modules': len(sys.modules),
+        'syspaths': len(sys.path),
+    }
+    rss = _rss_kb()
+    if rss is not None:
+        stats['rssKb'] = rss
+    usage = _rusage()
+    if usage is not None:
+        stats['maxRssKb'] = int(usage.ru_maxrss * _RSS_UNIT_KB)
+    return stats
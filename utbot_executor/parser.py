@@ -1,6 +1,15 @@
 import dataclasses
 import json
-from typing import Dict, List, Union
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Union
+
+from utbot_executor.coverage import COVERAGE_ENCODINGS, to_ranges
+from utbot_executor.deep_serialization.codec import get_codec, paused_gc
+from utbot_executor.deep_serialization.config import SerializationLimits
+from utbot_executor.deep_serialization.json_converter import as_repr_object, memory_dump_to_dict, \
+    memory_object_to_dict, serialize_memory_dump
+from utbot_executor.deep_serialization.memory_objects import MemoryDump, MemoryObject
+from utbot_executor.deep_serialization.utils import PythonId, encode_id
+from utbot_executor.ut_tracer import PATH_HASH_MODES
 
 
 @dataclasses.dataclass
@@ -11,9 +20,39 @@ class ExecutionRequest:
     syspaths: List[str]
     arguments_ids: List[str]
     kwarguments_ids: Dict[str, str]
-    serialized_memory: str
+    serialized_memory: Union[str, Dict]
     filepath: str
     coverage_id: str
+    serialization_limits: Optional[SerializationLimits] = None
+    intern_values: Optional[bool] = None
+    memory_handle: Optional[str] = None
+    protocol_version: int = 1
+    fields: Optional[FrozenSet[str]] = None
+    coverage_encoding: str = 'list'
+    coverage_session: Optional[str] = None
+    path_hash_mode: Optional[str] = None
+    coverage_bitmap: Optional[str] = None
+    force_tracing: bool = False
+    timeout_ms: Optional[int] = None
+    memory_limit: Optional[int] = None
+    measure_memory_peak: bool = False
+    metrics: bool = False
+    priority: int = 0
+    deadline_ms: Optional[int] = None
+
+
+@dataclasses.dataclass
+class MemoryHandleRequest:
+    handle: str
+    serialized_memory: Optional[Union[str, Dict]] = None
+
+
+@dataclasses.dataclass
+class LoadRequest:
+    imports: List[str]
+    syspaths: List[str]
+    functions: List[Tuple[str, str]]
+    warm_up_serializer: bool = False
 
 
 class ExecutionResponse:
@@ -24,15 +63,23 @@ class ExecutionResponse:
 class ExecutionSuccessResponse(ExecutionResponse):
     status: str
     is_exception: bool
-    statements: List[int]
-    missed_statements: List[int]
-    state_init: str
-    state_before: str
-    state_after: str
-    diff_ids: List[str]
-    args_ids: List[str]
-    kwargs_ids: Dict[str, str]
-    result_id: str
+    statements: Optional[List[int]]
+    missed_statements: Optional[List[int]]
+    state_init: Optional[MemoryDump]
+    state_before: Optional[MemoryDump]
+    state_after: Optional[MemoryDump]
+    diff_ids: Optional[List[PythonId]]
+    args_ids: Optional[List[PythonId]]
+    kwargs_ids: Optional[Dict[str, PythonId]]
+    result_id: Optional[PythonId]
+    is_truncated: bool = False
+    has_new_coverage: Optional[bool] = None
+    coverage_encoding: str = 'list'
+    path_hash: Optional[str] = None
+    coverage_skipped: bool = False
+    memory_peak: Optional[int] = None
+    metrics: Optional[Dict[str, Any]] = None
+    queue_wait_ns: Optional[int] = None
 
 
 @dataclasses.dataclass
@@ -41,18 +88,92 @@ class ExecutionFailResponse(ExecutionResponse):
     exception: str
 
 
+@dataclasses.dataclass
+class MemoryHandleResponse(ExecutionResponse):
+    status: str
+    handle: str
+
+
+@dataclasses.dataclass
+class LoadResponse(ExecutionResponse):
+    status: str
+    ready: bool
+    time_ns: int
+
+
+@dataclasses.dataclass
+class StatResponse(ExecutionResponse):
+    status: str
+    stats: Optional[Dict[str, Any]] = None
+
+
+PROTOCOL_VERSIONS = (1, 2)
+
+RESPONSE_FIELDS = frozenset({
+    'statements',
+    'missedStatements',
+    'stateInit',
+    'stateBefore',
+    'stateAfter',
+    'diffIds',
+    'argsIds',
+    'kwargsIds',
+    'resultId',
+})
+
+REQUEST_KEYS = {
+    'functionName',
+    'functionModule',
+    'imports',
+    'syspaths',
+    'argumentsIds',
+    'kwargumentsIds',
+    'serializedMemory',
+    'filepath',
+    'coverageId',
+}
+
+
+def as_serialization_limits(dct: Optional[Dict]) -> Optional[SerializationLimits]:
+    if dct is None:
+        return None
+    return SerializationLimits(
+            dct.get('maxContainerItems'),
+            dct.get('maxObjects'),
+            dct.get('maxDepth'),
+            )
+
+
+def as_response_fields(fields: Optional[List[str]]) -> Optional[FrozenSet[str]]:
+    if fields is None:
+        return None
+    unknown_fields = set(fields) - RESPONSE_FIELDS
+    if unknown_fields:
+        raise ValueError(f'Unknown response fields {sorted(unknown_fields)}')
+    return frozenset(fields)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
 def as_execution_result(dct: Dict) -> Union[ExecutionRequest, Dict]:
-    if set(dct.keys()) == {
-            'functionName',
-            'functionModule',
-            'imports',
-            'syspaths',
-            'argumentsIds',
-            'kwargumentsIds',
-            'serializedMemory',
-            'filepath',
-            'coverageId',
-            }:
+    if REQUEST_KEYS <= dct.keys():
+        protocol_version = dct.get('protocolVersion', 1)
+        if protocol_version not in PROTOCOL_VERSIONS:
+            raise ValueError(f'Unsupported protocol version {protocol_version}')
+        coverage_encoding = dct.get('coverageEncoding', 'list')
+        if coverage_encoding not in COVERAGE_ENCODINGS:
+            raise ValueError(f'Unknown coverage encoding {coverage_encoding}')
+        path_hash_mode = dct.get('pathHashMode')
+        if path_hash_mode is not None and path_hash_mode not in PATH_HASH_MODES:
+            raise ValueError(f'Unknown path hash mode {path_hash_mode}')
+        priority = dct.get('priority', 0)
+        if not _is_int(priority):
+            raise ValueError(f'Priority must be an integer, got {priority!r}')
+        deadline_ms = dct.get('deadlineMs')
+        if deadline_ms is not None and not _is_int(deadline_ms):
+            raise ValueError(f'Deadline must be an integer number of milliseconds, got {deadline_ms!r}')
         return ExecutionRequest(
                 dct['functionName'],
                 dct['functionModule'],
@@ -63,37 +184,198 @@ def as_execution_result(dct: Dict) -> Union[ExecutionRequest, Dict]:
                 dct['serializedMemory'],
                 dct['filepath'],
                 dct['coverageId'],
+                as_serialization_limits(dct.get('serializationLimits')),
+                dct.get('internValues'),
+                dct.get('memoryHandle'),
+                protocol_version,
+                as_response_fields(dct.get('fields')),
+                coverage_encoding,
+                dct.get('coverageSession'),
+                path_hash_mode,
+                dct.get('coverageBitmap'),
+                dct.get('forceTracing', False),
+                dct.get('timeoutMs'),
+                dct.get('memoryLimit'),
+                dct.get('memoryPeak', False),
+                dct.get('metrics', False),
+                priority,
+                deadline_ms,
                 )
     return dct
 
 
-def parse_request(request: str) -> ExecutionRequest:
-    return json.loads(request, object_hook=as_execution_result)
+REQUEST_OBJECT_HOOKS = (
+    ('strategy', as_repr_object),
+    ('functionName', as_execution_result),
+)
+
+
+def as_request_object(dct: Dict) -> Union[ExecutionRequest, MemoryObject, Dict]:
+    """Decode request and memory objects of embedded memory dump in one pass."""
+    for key, hook in REQUEST_OBJECT_HOOKS:
+        if key in dct:
+            return hook(dct)
+    return dct
+
+
+def parse_request(request: Union[str, bytes]) -> ExecutionRequest:
+    """Parse execution request.
+
+    If the codec applies hooks while decoding, memory objects of an embedded dump
+    are created in the same pass. Otherwise they are created by `as_memory_dump`
+    when the request is executed, which is faster than a second pass over the request."""
+    codec = get_codec()
+    with paused_gc():
+        if codec.hooks_while_decoding:
+            result = codec.loads(request, object_hook=as_request_object)
+        else:
+            result = codec.loads(request)
+            if isinstance(result, dict):
+                result = as_execution_result(result)
+    if not isinstance(result, ExecutionRequest):
+        raise ValueError('Invalid execution request')
+    return result
+
+
+def parse_memory_handle_request(request: Union[str, bytes]) -> MemoryHandleRequest:
+    codec = get_codec()
+    with paused_gc():
+        dct = codec.loads(request, object_hook=as_repr_object if codec.hooks_while_decoding else None)
+    return MemoryHandleRequest(dct['handle'], dct.get('serializedMemory'))
+
+
+def parse_load_request(request: Union[str, bytes]) -> LoadRequest:
+    with paused_gc():
+        dct = get_codec().loads(request)
+    return LoadRequest(
+            dct.get('imports', []),
+            dct.get('syspaths', []),
+            [(function['functionModule'], function['functionName']) for function in dct.get('functions', [])],
+            dct.get('warmUpSerializer', False),
+            )
+
+
+def _response_to_dict(
+        response: ExecutionResponse,
+        encode_memory_dump: Callable[[MemoryDump], Any],
+        ) -> Dict:
+    if isinstance(response, ExecutionSuccessResponse):
+        fields = {
+            "statements": response.statements,
+            "missedStatements": response.missed_statements,
+            "stateInit": response.state_init,
+            "stateBefore": response.state_before,
+            "stateAfter": response.state_after,
+            "diffIds": response.diff_ids,
+            "argsIds": response.args_ids,
+            "kwargsIds": response.kwargs_ids,
+            "resultId": response.result_id,
+        }
+        field_encoders = {
+            "statements": to_ranges if response.coverage_encoding == 'ranges' else None,
+            "missedStatements": to_ranges if response.coverage_encoding == 'ranges' else None,
+            "stateInit": encode_memory_dump,
+            "stateBefore": encode_memory_dump,
+            "stateAfter": encode_memory_dump,
+            "diffIds": lambda ids: [encode_id(id_) for id_ in ids],
+            "argsIds": lambda ids: [encode_id(id_) for id_ in ids],
+            "kwargsIds": lambda ids: {name: encode_id(id_) for name, id_ in ids.items()},
+            "resultId": encode_id,
+        }
+        dct = {
+            "status": response.status,
+            "isException": response.is_exception,
+        }
+        for name, value in fields.items():
+            if value is not None:  # excluded by request fields
+                encode = field_encoders.get(name)
+                dct[name] = value if encode is None else encode(value)
+        if response.has_new_coverage is not None:
+            dct["hasNewCoverage"] = response.has_new_coverage
+        if response.path_hash is not None:
+            dct["pathHash"] = response.path_hash
+        if response.coverage_skipped:
+            dct["coverageSkipped"] = True
+        if response.memory_peak is not None:
+            dct["memoryPeak"] = response.memory_peak
+        if response.metrics is not None:
+            dct["metrics"] = response.metrics
+        if response.queue_wait_ns is not None:
+            dct["queueWaitNs"] = response.queue_wait_ns
+        dct["isTruncated"] = response.is_truncated
+        return dct
+    if isinstance(response, ExecutionFailResponse):
+        return {
+            "status": response.status,
+            "exception": response.exception
+        }
+    if isinstance(response, MemoryHandleResponse):
+        return {
+            "status": response.status,
+            "handle": response.handle,
+        }
+    if isinstance(response, LoadResponse):
+        return {
+            "status": response.status,
+            "ready": response.ready,
+            "timeNs": response.time_ns,
+        }
+    if isinstance(response, StatResponse):
+        if response.stats is None:
+            return {"status": response.status}
+        return {"status": response.status, **response.stats}
+    raise TypeError(f'Unknown response type {type(response)}')
+
+
+def response_to_dict(response: ExecutionResponse, protocol_version: int = 1) -> Dict:
+    """Convert response to JSON-compatible dict.
+
+    In protocol v1 memory dumps are JSON strings, in v2 they are nested objects."""
+    if protocol_version >= 2:
+        return _response_to_dict(response, memory_dump_to_dict)
+    return _response_to_dict(response, serialize_memory_dump)
 
 
 class ResponseEncoder(json.JSONEncoder):
     def default(self, o):
-        if isinstance(o, ExecutionSuccessResponse):
-            return {
-                "status": o.status,
-                "isException": o.is_exception,
-                "statements": o.statements,
-                "missedStatements": o.missed_statements,
-                "stateInit": o.state_init,
-                "stateBefore": o.state_before,
-                "stateAfter": o.state_after,
-                "diffIds": o.diff_ids,
-                "argsIds": o.args_ids,
-                "kwargsIds": o.kwargs_ids,
-                "resultId": o.result_id,
-            }
-        if isinstance(o, ExecutionFailResponse):
-            return {
-                "status": o.status,
-                "exception": o.exception
-            }
+        if isinstance(o, ExecutionResponse):
+            return response_to_dict(o)
         return json.JSONEncoder.default(self, o)
 
 
-def serialize_response(response: ExecutionResponse) -> str:
-    return json.dumps(response, cls=ResponseEncoder)
+def serialize_response(response: ExecutionResponse, protocol_version: int = 1) -> str:
+    with paused_gc():
+        return get_codec().dumps(response_to_dict(response, protocol_version))
+
+
+def iterencode_response(
+        response: ExecutionResponse,
+        protocol_version: int = 1,
+        ) -> Iterator[str]:
+    """Encode response by parts, memory objects are converted while encoding.
+
+    Only protocol v2 responses can be split, v1 responses are encoded at once."""
+    if protocol_version < 2:
+        yield serialize_response(response, protocol_version)
+        return
+    codec = get_codec()
+    separator = '{'
+    for key, value in _response_to_dict(response, lambda dump: dump).items():
+        yield f'{separator}{codec.dumps(key)}:'
+        separator = ','
+        if isinstance(value, MemoryDump):
+            yield from _iterencode_memory_dump(value)
+        else:
+            yield codec.dumps(value)
+    yield '}'
+
+
+def _iterencode_memory_dump(memory_dump: MemoryDump) -> Iterator[str]:
+    codec = get_codec()
+    yield '{"objects":{'
+    separator = ''
+    for id_, memory_object in memory_dump.objects.items():
+        encoded_object = codec.dumps(memory_object_to_dict(memory_object))
+        yield f'{separator}"{encode_id(id_)}":{encoded_object}'
+        separator = ','
+    yield '}}'
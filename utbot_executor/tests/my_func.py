@@ -12,3 +12,31 @@ def f(a: A):
     if math.pi * a.x == 0:
         return 2
     return a.x
+
+
+def identity(x):
+    return x
+
+
+def count_down(n):
+    while n > 0:
+        n -= 1
+    return n
+
+
+def infinite_loop(x):
+    while x >= 0:
+        x += 1
+    return x
+
+
+def allocate(n):
+    chunks = []
+    for _ in range(n):
+        chunks.append(bytearray(2**20))
+    return len(chunks)
+
+
+def append_item(items):
+    items.append(len(items))
+    return len(items)
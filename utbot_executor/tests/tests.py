@@ -1,9 +1,129 @@
+import gc
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import threading
+import tracemalloc
 import typing
+from multiprocessing import resource_tracker, shared_memory
 
+import pytest
+
+from utbot_executor.coverage import from_ranges, to_ranges
 from utbot_executor.deep_serialization import deep_serialization
+from utbot_executor.deep_serialization.codec import CODECS, get_codec, paused_gc, set_codec
+from utbot_executor.deep_serialization.config import SerializationLimits
+from utbot_executor.deep_serialization.memory_objects import MemoryObject, PythonSerializer
 from utbot_executor.executor import PythonExecutor
-from utbot_executor.parser import ExecutionRequest, ExecutionSuccessResponse
+from utbot_executor.listener import PythonExecuteServer
+from utbot_executor.metrics import NULL_TIMER, MetricsAccumulator
+from utbot_executor.parser import ExecutionRequest, ExecutionSuccessResponse, ExecutionFailResponse, \
+    MemoryHandleRequest, serialize_response, parse_request, parse_memory_handle_request, iterencode_response
 from utbot_executor.tests.my_func import A
+from utbot_executor.transport import RING_HEADER_SIZE, UNIX_PREFIX, ByteRing
+from utbot_executor.watchdog import TIMEOUT_EXIT_CODE, ExecutionTimeout, MemoryBudget
+
+TESTS_DIR = pathlib.Path(__file__).parent
+
+
+def _make_request(
+        function_name: str,
+        args: typing.List[typing.Any],
+        **kwargs: typing.Any,
+        ) -> ExecutionRequest:
+    PythonSerializer().clear()
+    ids, serialized_memory = deep_serialization.serialize_objects(args, True)
+    return ExecutionRequest(
+        function_name,
+        'my_func',
+        ['my_func'],
+        [str(TESTS_DIR)],
+        ids,
+        {},
+        serialized_memory,
+        str(TESTS_DIR / 'my_func.py'),
+        '0x1',
+        **kwargs,
+    )
+
+
+def _make_a_request(function_name: str, values: typing.List[int], **kwargs: typing.Any) -> ExecutionRequest:
+    """Request with `A(value)` arguments, which also imports the module `A` is loaded from."""
+    request = _make_request(function_name, [A(value) for value in values], **kwargs)
+    request.imports.append(A.__module__)
+    return request
+
+
+def _start_server(**executor_options: typing.Any) -> typing.Tuple[socket.socket, threading.Thread]:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+        server_socket.bind(('localhost', 0))
+        server_socket.listen(1)
+        port = server_socket.getsockname()[1]
+        server_thread = threading.Thread(
+            target=lambda: PythonExecuteServer('localhost', port, '', 0, **executor_options).run(),
+            daemon=True,
+        )
+        server_thread.start()
+        connection, _ = server_socket.accept()
+    return connection, server_thread
+
+
+def _send_message(connection: socket.socket, command: bytes, message: typing.Any) -> None:
+    data = json.dumps(message).encode()
+    connection.sendall(command + str(len(data)).rjust(16).encode() + data)
+
+
+def _receive_message(connection: socket.socket) -> typing.Any:
+    header = b''
+    while not header.endswith(os.linesep.encode()):
+        header += connection.recv(1)
+    size = int(header.decode())
+    data = b''
+    while len(data) < size:
+        data += connection.recv(size - len(data))
+    return json.loads(data.decode())
+
+
+def _receive_chunked_message(connection: socket.socket) -> typing.Any:
+    chunks = []
+    while True:
+        chunk = _receive_chunk(connection)
+        if chunk is None:
+            chunks = []
+        elif chunk:
+            chunks.append(chunk)
+        else:
+            return json.loads(b''.join(chunks).decode())
+
+
+def _receive_chunk(connection: socket.socket) -> typing.Optional[bytes]:
+    header = b''
+    while not header.endswith(os.linesep.encode()):
+        header += connection.recv(1)
+    size = int(header.decode())
+    if size < 0:
+        return None
+    data = b''
+    while len(data) < size:
+        data += connection.recv(size - len(data))
+    return data
+
+
+def _as_json(request: ExecutionRequest) -> typing.Dict[str, typing.Any]:
+    return {
+        'functionName': request.function_name,
+        'functionModule': request.function_module,
+        'imports': request.imports,
+        'syspaths': request.syspaths,
+        'argumentsIds': request.arguments_ids,
+        'kwargumentsIds': request.kwarguments_ids,
+        'serializedMemory': request.serialized_memory,
+        'filepath': request.filepath,
+        'coverageId': request.coverage_id,
+    }
 
 
 def test_execution():
@@ -28,3 +148,838 @@ def test_execution():
     assert response.status == "success"
     assert response.is_exception is False
     assert response.diff_ids
+
+
+def test_serialization_limits():
+    executor = PythonExecutor("", 0, SerializationLimits(max_container_items=5))
+    response = executor.run_function(_make_request('identity', [list(range(10))]))
+
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.is_truncated
+    state_after = json.loads(deep_serialization.serialize_memory_dump(response.state_after))["objects"]
+    assert state_after[str(response.result_id)]["strategy"] == "summary"
+
+    response = executor.run_function(
+        _make_request('identity', [list(range(10))], fields=frozenset({'stateBefore'}))
+    )
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.state_after is None
+    assert response.is_truncated
+
+
+def test_serialization_limits_changed_summary():
+    executor = PythonExecutor("", 0, SerializationLimits(max_container_items=5))
+    response = executor.run_function(_make_request('append_item', [list(range(10))]))
+
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.is_truncated
+    assert response.diff_ids == response.args_ids
+
+    response = executor.run_function(_make_request('identity', [list(range(10))]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.diff_ids == []
+
+
+def test_serialization_limits_override():
+    executor = PythonExecutor("", 0, SerializationLimits(max_container_items=5))
+    request = _make_request(
+        'identity',
+        [list(range(10))],
+        serialization_limits=SerializationLimits(max_container_items=100),
+    )
+    response = executor.run_function(request)
+
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert not response.is_truncated
+
+
+def test_intern_values():
+    executor = PythonExecutor("", 0)
+    args = [[str(i % 2) + ' x' for i in range(20)]]
+    response = executor.run_function(_make_request('identity', args, intern_values=True))
+
+    assert isinstance(response, ExecutionSuccessResponse)
+    state_after = json.loads(deep_serialization.serialize_memory_dump(response.state_after))["objects"]
+    assert len(set(state_after[str(response.result_id)]["items"])) == 2
+
+
+def test_dump_cache():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, "a b"]])
+    first = executor.run_function(request)
+    second = executor.run_function(request)
+
+    assert isinstance(first, ExecutionSuccessResponse)
+    assert isinstance(second, ExecutionSuccessResponse)
+    assert executor.dump_cache.hits == 1
+    assert len(executor.dump_cache) == 1
+
+
+def test_value_cache_tuple_items():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [(1, 'a', (2.5, frozenset([3])))])
+    for _ in range(2):
+        response = executor.run_function(request)
+        assert isinstance(response, ExecutionSuccessResponse)
+        assert response.state_after.objects[response.result_id].obj == (1, 'a', (2.5, frozenset([3])))
+
+
+def _replace_int_delta(serialized_memory: str, old_value: int, new_value: int) -> str:
+    objects = json.loads(serialized_memory)["objects"]
+    delta = {
+        id_: dict(obj, value=str(new_value))
+        for id_, obj in objects.items()
+        if obj["strategy"] == "repr" and obj["value"] == str(old_value)
+    }
+    return json.dumps({"objects": delta, "removed": []})
+
+
+def test_memory_handle():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 2]])
+    executor.store_memory(MemoryHandleRequest('base', request.serialized_memory))
+
+    request.memory_handle = 'base'
+    request.serialized_memory = _replace_int_delta(request.serialized_memory, 2, 5)
+    response = executor.run_function(request)
+
+    assert isinstance(response, ExecutionSuccessResponse)
+    state_after = json.loads(deep_serialization.serialize_memory_dump(response.state_after))["objects"]
+    items = state_after[str(response.result_id)]["items"]
+    assert [state_after[item]["value"] for item in items] == ["1", "5"]
+
+    executor.release_memory(MemoryHandleRequest('base'))
+    assert isinstance(executor.run_function(request), ExecutionFailResponse)
+
+
+def test_memory_handle_unused_objects():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 2], [3, 4]])
+    executor.store_memory(MemoryHandleRequest('base', request.serialized_memory))
+    request.arguments_ids.pop()
+
+    request.memory_handle = 'base'
+    request.serialized_memory = json.dumps({"objects": {}, "removed": []})
+    PythonSerializer().clear()
+    response = executor.run_function(request)
+
+    assert isinstance(response, ExecutionSuccessResponse)
+    state_init = json.loads(deep_serialization.serialize_memory_dump(response.state_init))["objects"]
+    assert [state_init[item]["value"] for item in state_init[str(response.result_id)]["items"]] == ["1", "2"]
+    assert sorted(obj["value"] for obj in state_init.values() if obj["strategy"] == "repr") == ["1", "2"]
+
+
+def test_listener_memory_handle():
+    connection, server_thread = _start_server()
+    request = _make_request('identity', [[1, 2]])
+
+    _send_message(connection, b'BASE', {'handle': 'h', 'serializedMemory': request.serialized_memory})
+    assert _receive_message(connection) == {'status': 'success', 'handle': 'h'}
+
+    message = _as_json(request)
+    message['memoryHandle'] = 'h'
+    message['serializedMemory'] = json.dumps({"objects": {}})
+    _send_message(connection, b'DATA', message)
+    assert _receive_message(connection)['status'] == 'success'
+
+    _send_message(connection, b'FREE', {'handle': 'h'})
+    assert _receive_message(connection)['status'] == 'success'
+    _send_message(connection, b'FREE', {'handle': 'h'})
+    assert _receive_message(connection)['status'] == 'fail'
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def test_nested_response():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 'a', (2.5, None)]])
+    response = executor.run_function(request)
+    assert isinstance(response, ExecutionSuccessResponse)
+
+    response_v1 = json.loads(serialize_response(response))
+    response_v2 = json.loads(serialize_response(response, 2))
+    for state in ('stateInit', 'stateBefore', 'stateAfter'):
+        assert json.loads(response_v1[state]) == response_v2[state]
+        del response_v1[state], response_v2[state]
+    assert response_v1 == response_v2
+
+
+def test_listener_chunked_response():
+    connection, server_thread = _start_server()
+    request = _make_request('identity', [list(range(1000))])
+
+    message = _as_json(request)
+    message['protocolVersion'] = 2
+    _send_message(connection, b'DATA', message)
+    response = _receive_chunked_message(connection)
+    assert response['status'] == 'success'
+    state_after = response['stateAfter']['objects']
+    assert len(state_after[response['resultId']]['items']) == 1000
+
+    message['protocolVersion'] = 3
+    _send_message(connection, b'DATA', message)
+    assert _receive_message(connection)['status'] == 'fail'
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def test_nested_request():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 'a', (2.5, None)]])
+
+    message = _as_json(request)
+    message['serializedMemory'] = json.loads(request.serialized_memory)
+    message['protocolVersion'] = 2
+    nested_request = parse_request(json.dumps(message))
+    assert nested_request.protocol_version == 2
+    response = executor.run_function(nested_request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.state_after.objects[response.result_id].obj == [1, 'a', (2.5, None)]
+
+    executor.store_memory(parse_memory_handle_request(json.dumps(
+        {'handle': 'base', 'serializedMemory': message['serializedMemory']}
+    )))
+    message['memoryHandle'] = 'base'
+    message['serializedMemory'] = {'objects': {}, 'removed': []}
+    response = executor.run_function(parse_request(json.dumps(message)))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.state_after.objects[response.result_id].obj == [1, 'a', (2.5, None)]
+
+
+@pytest.mark.parametrize('codec_name', sorted(CODECS))
+def test_nested_request_codecs(codec_name: str):
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 'a', {'strategy': (2.5, None)}]])
+    message = _as_json(request)
+    message['serializedMemory'] = json.loads(request.serialized_memory)
+    message['protocolVersion'] = 2
+
+    old_codec = get_codec()
+    codec = set_codec(codec_name)
+    try:
+        nested_request = parse_request(json.dumps(message))
+    finally:
+        set_codec(old_codec.name)
+    objects = nested_request.serialized_memory['objects'].values()
+    assert all(isinstance(obj, MemoryObject) == codec.hooks_while_decoding for obj in objects)
+    response = executor.run_function(nested_request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.state_after.objects[response.result_id].obj == [1, 'a', {'strategy': (2.5, None)}]
+
+
+def _parse_v1_response(response: str) -> typing.Dict[str, typing.Any]:
+    response_json = json.loads(response)
+    for state in ('stateInit', 'stateBefore', 'stateAfter'):
+        response_json[state] = json.loads(response_json[state])
+    return response_json
+
+
+@pytest.mark.parametrize('codec_name', sorted(CODECS))
+def test_response_codecs(codec_name: str):
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 'a\u044f"', {(2.5, None): b'x'}]])
+    response = executor.run_function(request)
+    expected_v1 = _parse_v1_response(serialize_response(response))
+    expected_v2 = json.loads(serialize_response(response, 2))
+
+    old_codec = get_codec()
+    set_codec(codec_name)
+    try:
+        assert parse_request(json.dumps(_as_json(request))) == request
+        assert _parse_v1_response(serialize_response(response)) == expected_v1
+        assert json.loads(serialize_response(response, 2)) == expected_v2
+        assert json.loads(''.join(iterencode_response(response, 2))) == expected_v2
+    finally:
+        set_codec(old_codec.name)
+
+
+def test_response_fields():
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [[1, 'a']], fields=frozenset({'statements', 'missedStatements'}))
+    PythonSerializer().clear()
+    response = executor.run_function(request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.statements and response.state_before is None and response.result_id is None
+    assert not PythonSerializer().memory.objects
+    assert set(json.loads(serialize_response(response))) == {
+        'status', 'isException', 'statements', 'missedStatements', 'isTruncated',
+    }
+
+    request.fields = frozenset({'resultId', 'diffIds'})
+    response = executor.run_function(request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.diff_ids == [] and response.result_id is not None
+    assert response.state_after is None and response.statements is None
+
+    message = _as_json(request)
+    message['fields'] = ['stateAfter']
+    assert parse_request(json.dumps(message)).fields == {'stateAfter'}
+    message['fields'] = ['stateAfter', 'coverage']
+    with pytest.raises(ValueError):
+        parse_request(json.dumps(message))
+
+
+def test_coverage_ranges():
+    assert to_ranges([7, 1, 2, 3, 5, 2]) == [[1, 3], [5, 5], [7, 7]]
+    assert from_ranges(to_ranges([7, 1, 2, 3, 5])) == [1, 2, 3, 5, 7]
+
+    executor = PythonExecutor("", 0)
+    request = _make_request('identity', [1], coverage_encoding='ranges')
+    response = executor.run_function(request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    response_json = json.loads(serialize_response(response))
+    assert response_json['statements'] == to_ranges(response.statements)
+    assert response_json['missedStatements'] == to_ranges(response.missed_statements)
+    assert 'hasNewCoverage' not in response_json
+
+
+def test_coverage_session():
+    executor = PythonExecutor("", 0)
+    full_response = executor.run_function(_make_a_request('f', [1]))
+    assert isinstance(full_response, ExecutionSuccessResponse)
+
+    first_response = executor.run_function(_make_a_request('f', [1], coverage_session='s'))
+    assert isinstance(first_response, ExecutionSuccessResponse)
+    assert first_response.has_new_coverage
+    assert first_response.statements == full_response.statements
+    assert first_response.missed_statements == full_response.missed_statements
+
+    repeated_response = executor.run_function(_make_a_request('f', [2], coverage_session='s'))
+    assert isinstance(repeated_response, ExecutionSuccessResponse)
+    assert repeated_response.has_new_coverage is False
+    assert repeated_response.statements == []
+    assert repeated_response.missed_statements == full_response.missed_statements
+
+    new_response = executor.run_function(_make_a_request('f', [-1], coverage_session='s'))
+    assert isinstance(new_response, ExecutionSuccessResponse)
+    assert new_response.has_new_coverage
+    assert new_response.statements
+    assert not set(new_response.statements) & set(first_response.statements)
+    assert len(new_response.missed_statements) < len(full_response.missed_statements)
+    assert json.loads(serialize_response(new_response))['hasNewCoverage'] is True
+
+    other_response = executor.run_function(_make_a_request('f', [1], coverage_session='t'))
+    assert isinstance(other_response, ExecutionSuccessResponse)
+    assert other_response.statements == full_response.statements
+
+
+@pytest.mark.parametrize('mode', ['arcs', 'buckets'])
+def test_path_hash(mode: str):
+    executor = PythonExecutor("", 0)
+
+    def path_hash(request: ExecutionRequest) -> str:
+        request.path_hash_mode = mode
+        response = executor.run_function(request)
+        assert isinstance(response, ExecutionSuccessResponse)
+        assert len(response.path_hash) == 16
+        assert json.loads(serialize_response(response))['pathHash'] == response.path_hash
+        return response.path_hash
+
+    assert path_hash(_make_a_request('f', [1])) == path_hash(_make_a_request('f', [2]))
+    assert path_hash(_make_a_request('f', [1])) != path_hash(_make_a_request('f', [-1]))
+    assert path_hash(_make_request('count_down', [1])) != path_hash(_make_request('count_down', [8]))
+    if mode == 'buckets':
+        assert path_hash(_make_request('count_down', [9])) == path_hash(_make_request('count_down', [10]))
+    else:
+        assert path_hash(_make_request('count_down', [9])) != path_hash(_make_request('count_down', [10]))
+
+    response = executor.run_function(_make_a_request('f', [1]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.path_hash is None
+    assert 'pathHash' not in json.loads(serialize_response(response))
+
+
+def test_coverage_bitmap():
+    segment = shared_memory.SharedMemory(create=True, size=1024)
+    try:
+        segment.buf[:] = bytes(1024)
+        executor = PythonExecutor("", 0)
+        request = _make_request('count_down', [300], coverage_bitmap=segment.name)
+        response = executor.run_function(request)
+        assert isinstance(response, ExecutionSuccessResponse)
+        hit_lines = [line for line in range(1024) if segment.buf[line]]
+        assert hit_lines == sorted(response.statements[1:])
+        assert max(segment.buf) == 255
+
+        request.coverage_bitmap = 'utbot-missing-bitmap'
+        assert isinstance(executor.run_function(request), ExecutionFailResponse)
+        bitmap = executor.get_coverage_bitmap(segment.name)
+        executor.close()
+        assert bitmap.segment.buf is None
+        assert len(executor.coverage_bitmaps) == 0
+        if sys.version_info < (3, 13) and sys.platform != 'win32':
+            # executor in the same process has unregistered the segment of the client
+            resource_tracker.register(segment._name, 'shared_memory')
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def test_coverage_saturation():
+    executor = PythonExecutor("", 0, saturation_threshold=2, saturation_trace_every=3)
+
+    def coverage_skipped(**kwargs: typing.Any) -> bool:
+        response = executor.run_function(_make_a_request('f', [1], **kwargs))
+        assert isinstance(response, ExecutionSuccessResponse)
+        assert response.result_id is not None
+        assert (response.statements is None) == response.coverage_skipped
+        return response.coverage_skipped
+
+    assert [coverage_skipped() for _ in range(8)] == [False, False, False, True, True, False, True, True]
+    assert not coverage_skipped(force_tracing=True)
+    assert [coverage_skipped() for _ in range(2)] == [False, True]
+
+    response = executor.run_function(_make_a_request('f', [1]))
+    assert json.loads(serialize_response(response))['coverageSkipped'] is True
+    response = executor.run_function(_make_request('identity', [1]))
+    assert 'coverageSkipped' not in json.loads(serialize_response(response))
+
+
+def test_coverage_saturation_functions():
+    executor = PythonExecutor("", 0, saturation_threshold=2, saturation_functions_items=1)
+    response = executor.run_function(_make_request('count_down', [2]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert executor.saturation.functions.get(('my_func', 'count_down')).covered == set(response.statements[1:])
+
+    executor.run_function(_make_request('identity', [1]))
+    assert len(executor.saturation.functions) == 1
+    assert ('my_func', 'count_down') not in executor.saturation.functions
+
+
+def test_timeout():
+    executor = PythonExecutor("", 0, timeout_ms=5000)
+    response = executor.run_function(_make_request('infinite_loop', [0], timeout_ms=100))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.status == 'timeout'
+    assert response.is_exception
+    assert response.statements
+    assert json.loads(serialize_response(response))['status'] == 'timeout'
+
+    response = executor.run_function(_make_request('identity', [1]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.status == 'success'
+
+    watchdog_thread = executor.watchdog.thread
+    for _ in range(3):
+        executor.run_function(_make_request('identity', [1]))
+    assert executor.watchdog.thread is watchdog_thread and watchdog_thread.is_alive()
+    executor.close()
+    assert not watchdog_thread.is_alive()
+
+
+def test_timeout_exit():
+    code = (
+        'import time\n'
+        'from utbot_executor.watchdog import Watchdog\n'
+        'with Watchdog(0.1, 0.1):\n'
+        '    time.sleep(10)\n'
+    )
+    process = subprocess.run(
+        [sys.executable, '-c', code], cwd=TESTS_DIR.parent.parent, timeout=5,
+    )
+    assert process.returncode == TIMEOUT_EXIT_CODE
+
+
+def test_memory_limit():
+    executor = PythonExecutor("", 0, memory_limit=2**26)
+    response = executor.run_function(_make_request('allocate', [1000]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.status == 'memoryLimit'
+    assert response.is_exception
+    assert 2**26 <= response.memory_peak < 2**28
+    assert json.loads(serialize_response(response))['status'] == 'memoryLimit'
+
+    response = executor.run_function(_make_request('allocate', [4]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.status == 'success'
+    assert 4 * 2**20 <= response.memory_peak < 2**26
+
+    response = PythonExecutor("", 0).run_function(_make_request('allocate', [4]))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.memory_peak is None
+    response = PythonExecutor("", 0).run_function(_make_request('allocate', [4], measure_memory_peak=True))
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert json.loads(serialize_response(response))['memoryPeak'] >= 4 * 2**20
+
+
+def test_memory_budget_lock():
+    lock = threading.Lock()
+    allocated = []
+
+    def allocate():
+        with lock:
+            allocated.append(len(bytearray(2**24)))
+
+    thread = threading.Thread(target=allocate)
+    with MemoryBudget(None, measure_peak=True, lock=lock) as budget:
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+    thread.join(5)
+    assert allocated == [2**24]
+    assert budget.peak < 2**24
+
+
+def test_memory_budget_interrupted_exit():
+    class InterruptedPoller:
+        def join(self):
+            raise ExecutionTimeout()
+
+    lock = threading.Lock()
+    with pytest.raises(ExecutionTimeout):
+        with MemoryBudget(2**30, lock=lock) as budget:
+            budget.poller = InterruptedPoller()
+    assert not tracemalloc.is_tracing()
+    assert not lock.locked()
+    assert budget.peak is not None
+
+
+def test_paused_gc_in_background_thread():
+    paused = threading.Event()
+    resume = threading.Event()
+
+    def pause():
+        with paused_gc():
+            paused.set()
+            resume.wait(5)
+
+    thread = threading.Thread(target=pause)
+    thread.start()
+    paused.wait(5)
+    try:
+        assert gc.isenabled()
+    finally:
+        resume.set()
+        thread.join(5)
+
+
+def test_metrics():
+    executor = PythonExecutor("", 0, collect_metrics=True)
+    request = _make_request('identity', [[1, 2]], metrics=True)
+    response = executor.run_function(request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    phases = response.metrics['phasesNs']
+    assert {'loadMemory', 'imports', 'loadArguments', 'stateInit', 'call', 'stateAfter'} <= phases.keys()
+    assert sum(phases.values()) <= response.metrics['totalNs']
+    assert json.loads(serialize_response(response))['metrics'] == response.metrics
+
+    request.metrics = False
+    response = executor.run_function(request)
+    assert isinstance(response, ExecutionSuccessResponse)
+    assert response.metrics is None
+    assert executor.metrics.stats()['requests'] == 2
+    assert executor.metrics.stats()['phasesNs']['call'] > 0
+
+    assert PythonExecutor("", 0).create_timer(request) is NULL_TIMER
+
+
+def test_metrics_histogram_buckets():
+    metrics = MetricsAccumulator()
+    for duration_ns in (0, 1000, 1001, 2000, 4000, 4001, 1_000_000):
+        metrics.add_phase('call', duration_ns)
+    assert metrics.stats()['histogramsUs']['call'] == {'1': 2, '2': 2, '4': 1, '8': 1, '1024': 1}
+
+
+def test_listener_metrics():
+    connection, server_thread = _start_server(collect_metrics=True)
+    message = _as_json(_make_request('identity', [1]))
+    message['metrics'] = True
+    _send_message(connection, b'DATA', message)
+    response = _receive_message(connection)
+    assert {'receive', 'parse', 'queue', 'call'} <= response['metrics']['phasesNs'].keys()
+    assert sum(response['metrics']['phasesNs'].values()) <= response['metrics']['totalNs']
+
+    for request_id, function_name, options in [('slow', 'infinite_loop', {'timeoutMs': 200}), ('queued', 'identity', {})]:
+        data = json.dumps({**_as_json(_make_request(function_name, [1])), **options, 'metrics': True}).encode()
+        connection.sendall(b'PIPE' + request_id.ljust(16).encode() + str(len(data)).rjust(16).encode() + data)
+    for request_id in ('slow', 'queued'):
+        assert _receive_line(connection) == request_id
+        metrics = _receive_message(connection)['metrics']
+        assert sum(metrics['phasesNs'].values()) <= metrics['totalNs']
+    assert metrics['phasesNs']['queue'] >= 100_000_000
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def test_listener_stat():
+    connection, server_thread = _start_server(collect_metrics=True)
+    connection.sendall(b'PING')
+    assert _receive_message(connection) == {'status': 'success'}
+
+    _send_message(connection, b'DATA', _as_json(_make_request('identity', [1])))
+    assert _receive_message(connection)['status'] == 'success'
+    _send_message(connection, b'DATA', {})
+    assert _receive_message(connection)['status'] == 'fail'
+
+    connection.sendall(b'STAT')
+    stats = _receive_message(connection)
+    assert stats['requests'] == 2
+    assert stats['statuses'] == {'success': 1, 'fail': 1}
+    assert stats['metrics']['requests'] == 1
+    assert sum(stats['metrics']['histogramsUs']['call'].values()) == 1
+    assert stats['caches']['dumps']['misses'] == 1
+    assert stats['process']['modules'] > 0
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def test_listener_load():
+    connection, server_thread = _start_server()
+    message = {
+        'imports': ['my_func'],
+        'syspaths': [str(TESTS_DIR)],
+        'functions': [{'functionModule': 'my_func', 'functionName': 'A.__init__'}],
+        'warmUpSerializer': True,
+    }
+    _send_message(connection, b'LOAD', message)
+    response = _receive_message(connection)
+    assert response['status'] == 'success' and response['ready'] and response['timeNs'] > 0
+
+    message['functions'] = [{'functionModule': 'my_func', 'functionName': 'missing'}]
+    _send_message(connection, b'LOAD', message)
+    assert _receive_message(connection)['status'] == 'fail'
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def _receive_line(connection: socket.socket) -> str:
+    line = b''
+    while not line.endswith(os.linesep.encode()):
+        line += connection.recv(1)
+    return line.decode().strip()
+
+
+def test_listener_pipelined_requests():
+    connection, server_thread = _start_server(queue_size=2)
+    expected = {}
+    for i in range(5):
+        message = _as_json(_make_request('identity', [i]))
+        message['protocolVersion'] = 2 if i % 2 else 1
+        data = json.dumps(message).encode()
+        request_id = f'request-{i}'
+        expected[request_id] = message['protocolVersion']
+        connection.sendall(b'PIPE' + request_id.ljust(16).encode() + str(len(data)).rjust(16).encode() + data)
+
+    for _ in range(5):
+        request_id = _receive_line(connection)
+        if expected.pop(request_id) == 2:
+            response = _receive_chunked_message(connection)
+            state_after = response['stateAfter']
+        else:
+            response = _receive_message(connection)
+            state_after = json.loads(response['stateAfter'])
+        assert response['status'] == 'success'
+        assert state_after['objects'][response['resultId']]['value'] == request_id[-1]
+    assert not expected
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def test_listener_pipelined_large_requests():
+    connection, server_thread = _start_server(memory_limit=2**30)
+    connection.settimeout(30)
+    message = _as_json(_make_request('identity', ['x' * 2**21]))
+    data = json.dumps(message).encode()
+    for i in range(20):
+        connection.sendall(b'PIPE' + f'request-{i}'.ljust(16).encode() + str(len(data)).rjust(16).encode() + data)
+
+    for i in range(20):
+        assert _receive_line(connection) == f'request-{i}'
+        assert _receive_message(connection)['status'] == 'success'
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def test_listener_priority_and_deadline():
+    connection, server_thread = _start_server()
+    requests = [
+        ('slow', 'infinite_loop', {'timeoutMs': 300, 'priority': 10}),
+        ('low', 'identity', {}),
+        ('late', 'identity', {'deadlineMs': 50}),
+        ('high', 'identity', {'priority': 5}),
+    ]
+    for request_id, function_name, options in requests:
+        data = json.dumps({**_as_json(_make_request(function_name, [1])), **options}).encode()
+        connection.sendall(b'PIPE' + request_id.ljust(16).encode() + str(len(data)).rjust(16).encode() + data)
+
+    responses = []
+    for _ in requests:
+        request_id = _receive_line(connection)
+        responses.append((request_id, _receive_message(connection)))
+    assert [request_id for request_id, _ in responses] == ['slow', 'high', 'low', 'late']
+    statuses = {request_id: response['status'] for request_id, response in responses}
+    assert statuses == {'slow': 'timeout', 'high': 'success', 'low': 'success', 'late': 'expired'}
+    assert dict(responses)['high']['queueWaitNs'] >= 250_000_000
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+@pytest.mark.parametrize('options', [
+    {'priority': None},
+    {'priority': 'high'},
+    {'priority': True},
+    {'deadlineMs': 1.5},
+    {'deadlineMs': '100'},
+])
+def test_invalid_scheduling_options(options: typing.Dict[str, typing.Any]):
+    with pytest.raises(ValueError):
+        parse_request(json.dumps({**_as_json(_make_request('identity', [1])), **options}))
+
+
+def test_listener_pipelined_parse_error():
+    connection, server_thread = _start_server()
+    for request_id, data in [
+        ('broken', b'{"functionName": '),
+        ('priority', json.dumps({**_as_json(_make_request('identity', [1])), 'priority': None}).encode()),
+        ('valid', json.dumps(_as_json(_make_request('identity', [1]))).encode()),
+    ]:
+        connection.sendall(b'PIPE' + request_id.ljust(16).encode() + str(len(data)).rjust(16).encode() + data)
+
+    assert _receive_line(connection) == 'broken'
+    response = _receive_message(connection)
+    assert response['status'] == 'fail'
+    assert 'Traceback' in response['exception']
+    assert _receive_line(connection) == 'priority'
+    assert _receive_message(connection)['status'] == 'fail'
+    assert _receive_line(connection) == 'valid'
+    assert _receive_message(connection)['status'] == 'success'
+
+    connection.sendall(b'STOP')
+    server_thread.join(5)
+    connection.close()
+    assert not server_thread.is_alive()
+
+
+def _start_unix_server(path: str, **options: typing.Any) -> typing.Tuple[socket.socket, threading.Thread]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server_socket:
+        server_socket.bind(path)
+        server_socket.listen(1)
+        server_thread = threading.Thread(
+            target=lambda: PythonExecuteServer(f'{UNIX_PREFIX}{path}', 0, '', 0, **options).run(),
+            daemon=True,
+        )
+        server_thread.start()
+        connection, _ = server_socket.accept()
+    return connection, server_thread
+
+
+def test_listener_unix_socket_shared_memory_ring(tmp_path):
+    segment = shared_memory.SharedMemory(create=True, size=2 * (RING_HEADER_SIZE + 4096))
+    half = len(segment.buf) // 2
+    requests_ring = ByteRing(segment.buf[:half])
+    responses_ring = ByteRing(segment.buf[half:2 * half])
+    try:
+        connection, server_thread = _start_unix_server(
+            str(tmp_path / 'executor.sock'), shared_memory_ring=segment.name,
+        )
+
+        argument = ['x' * 100] * 100  # the request and the response are larger than the ring
+        for protocol_version in (1, 2):
+            message = _as_json(_make_request('identity', [argument]))
+            message['protocolVersion'] = protocol_version
+            data = json.dumps(message).encode()
+            connection.sendall(b'DATA' + str(len(data)).rjust(16).encode())
+            requests_ring.write(data)
+
+            chunks = []
+            while True:
+                size = int(_receive_line(connection))
+                chunks.append(responses_ring.read(size))
+                if protocol_version == 1 or size == 0:
+                    break
+            response = json.loads(b''.join(chunks).decode())
+            assert response['status'] == 'success'
+            state_after = response['stateAfter']
+            if protocol_version == 1:
+                state_after = json.loads(state_after)
+            assert len(state_after['objects'][response['resultId']]['items']) == 100
+
+        connection.sendall(b'STOP')
+        server_thread.join(5)
+        connection.close()
+        assert not server_thread.is_alive()
+    finally:
+        for ring in (requests_ring, responses_ring):
+            ring.header.release()
+            ring.data.release()
+        segment.close()
+        if sys.version_info < (3, 13) and sys.platform != 'win32':
+            resource_tracker.register(segment._name, 'shared_memory')  # unregistered by the executor
+        segment.unlink()
+
+
+def test_listener_shared_memory_ring_client_died(tmp_path):
+    segment = shared_memory.SharedMemory(create=True, size=2 * (RING_HEADER_SIZE + 4096))
+    requests_ring = ByteRing(segment.buf[:len(segment.buf) // 2])
+    try:
+        connection, server_thread = _start_unix_server(
+            str(tmp_path / 'executor.sock'), shared_memory_ring=segment.name,
+        )
+        connection.sendall(b'DATA' + b'100'.rjust(16))
+        requests_ring.write(b'{' * 10)
+        connection.close()
+        server_thread.join(5)
+        assert not server_thread.is_alive()
+    finally:
+        requests_ring.header.release()
+        requests_ring.data.release()
+        segment.close()
+        if sys.version_info < (3, 13) and sys.platform != 'win32':
+            resource_tracker.register(segment._name, 'shared_memory')  # unregistered by the executor
+        segment.unlink()
+
+
+def test_coverage_unix_socket(tmp_path):
+    path = str(tmp_path / 'coverage.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as coverage_socket:
+        coverage_socket.bind(path)
+        coverage_socket.settimeout(1)
+        executor = PythonExecutor(f'{UNIX_PREFIX}{path}', 0)
+        response = executor.run_function(_make_request('count_down', [2]))
+        assert response.status == 'success'
+
+        traced_lines = response.statements[1:]
+        messages = {coverage_socket.recv(1024).decode() for _ in traced_lines}
+        assert messages == {f'0x1:{line}' for line in traced_lines}
+
+
+def test_coverage_unix_socket_full(tmp_path):
+    path = str(tmp_path / 'coverage.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as coverage_socket, \
+            socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as client_socket:
+        coverage_socket.bind(path)
+        client_socket.setblocking(False)
+        with pytest.raises(BlockingIOError):
+            while True:
+                client_socket.sendto(b'0x0:0', path)
+
+        executor = PythonExecutor(f'{UNIX_PREFIX}{path}', 0, timeout_ms=2000)
+        response = executor.run_function(_make_request('count_down', [2]))
+        assert response.status == 'success'
+
+    response = executor.run_function(_make_request('count_down', [2]))
+    assert response.status == 'success'  # the socket is gone
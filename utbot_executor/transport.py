@@ -0,0 +1,146 @@
+"""Local transports: unix domain socket endpoints and shared memory ring buffers."""
+import socket
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Optional, Tuple
+
+UNIX_PREFIX = 'unix:'
+
+RING_HEADER_SIZE = 16
+MAX_WAIT = 0.001
+
+
+def is_unix_endpoint(hostname: str) -> bool:
+    return hostname.startswith(UNIX_PREFIX)
+
+
+def socket_address(hostname: str, port: int) -> Tuple[int, Any]:
+    """Socket family and address of `hostname:port` or of `unix:/path` (the port is ignored)."""
+    if is_unix_endpoint(hostname):
+        return socket.AF_UNIX, hostname[len(UNIX_PREFIX):]
+    return socket.AF_INET, (hostname, port)
+
+
+def connect(hostname: str, port: int) -> socket.socket:
+    family, address = socket_address(hostname, port)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(address)
+    return sock
+
+
+def is_closed(sock: socket.socket) -> bool:
+    """Check without blocking whether the other side has closed the stream socket."""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b''
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach a shared memory segment owned by the client.
+
+    The executor never unlinks it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    segment = shared_memory.SharedMemory(name)
+    if sys.platform != 'win32':
+        # attached segment is registered as if it was created by this process
+        # and would be unlinked by the resource tracker at exit
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+class ByteRing:
+    """Single producer, single consumer byte stream in a shared memory buffer.
+
+    The header holds two little-endian 64-bit counters of all written and read bytes;
+    each counter is updated by one side only, after the data is copied. A writer waits
+    while the ring is full and a reader waits until enough bytes are written, so messages
+    larger than the ring are streamed through it. While waiting, `closed` is polled and
+    `ConnectionError` is raised when it returns `True`, e.g. when the other side has died."""
+
+    def __init__(self, buffer: memoryview, closed: Optional[Callable[[], bool]] = None):
+        self.header = buffer[:RING_HEADER_SIZE]
+        self.data = buffer[RING_HEADER_SIZE:]
+        self.capacity = len(self.data)
+        self.closed = closed
+
+    def _counter(self, offset: int) -> int:
+        return int.from_bytes(self.header[offset:offset + 8], 'little')
+
+    def _set_counter(self, offset: int, value: int) -> None:
+        self.header[offset:offset + 8] = value.to_bytes(8, 'little')
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        written = self._counter(0)
+        wait = 0.0
+        while view:
+            free = self.capacity - (written - self._counter(8))
+            if free == 0:
+                wait = self._wait(wait)
+                continue
+            wait = 0.0
+            size = self._copy_in(written % self.capacity, view[:free])
+            view = view[size:]
+            written += size
+            self._set_counter(0, written)
+
+    def read(self, size: int) -> bytes:
+        result = bytearray(size)
+        view = memoryview(result)
+        read = self._counter(8)
+        wait = 0.0
+        while view:
+            available = self._counter(0) - read
+            if available == 0:
+                wait = self._wait(wait)
+                continue
+            wait = 0.0
+            count = self._copy_out(read % self.capacity, view[:available])
+            view = view[count:]
+            read += count
+            self._set_counter(8, read)
+        return bytes(result)
+
+    def _wait(self, wait: float) -> float:
+        if wait == MAX_WAIT and self.closed is not None and self.closed():
+            raise ConnectionError('Connection closed while waiting for the ring')
+        time.sleep(wait)
+        return min(MAX_WAIT, wait * 2 or 1e-6)
+
+    def _copy_in(self, position: int, data: memoryview) -> int:
+        size = min(len(data), self.capacity - position)
+        self.data[position:position + size] = data[:size]
+        return size
+
+    def _copy_out(self, position: int, target: memoryview) -> int:
+        size = min(len(target), self.capacity - position)
+        target[:size] = self.data[position:position + size]
+        return size
+
+
+class SharedMemoryRing:
+    """Two byte rings in a shared memory segment created by the client.
+
+    The first half of the segment carries messages from the client to the executor,
+    the second half carries responses back."""
+
+    def __init__(self, name: str, closed: Optional[Callable[[], bool]] = None):
+        self.name = name
+        self.segment = attach_shared_memory(name)
+        half = len(self.segment.buf) // 2
+        if half <= RING_HEADER_SIZE:
+            self.segment.close()
+            raise ValueError(f'Shared memory segment {name} is too small for a ring')
+        self.incoming = ByteRing(self.segment.buf[:half], closed)
+        self.outgoing = ByteRing(self.segment.buf[half:2 * half], closed)
+
+    def close(self) -> None:
+        for ring in (self.incoming, self.outgoing):
+            ring.header.release()
+            ring.data.release()
+        self.segment.close()
@@ -2,6 +2,57 @@ import os
 import sys
 import typing
 
+from utbot_executor.coverage import CoverageBitmap
+
+
+PATH_HASH_MODES = ('arcs', 'buckets')
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+_HASH_MASK = 2**64 - 1
+
+
+def _hit_bucket(hits: int) -> int:
+    """AFL-style bucket of arc hit count: 1, 2, 3, 4-7, 8-15, 16-31, 32-127, 128+."""
+    if hits <= 3:
+        return hits
+    if hits < 32:
+        return hits.bit_length() + 1
+    return 7 if hits < 128 else 8
+
+
+class PathHash:
+    """Fingerprint of executed line arcs.
+
+    In `arcs` mode it is a rolling hash of the whole arcs sequence, in `buckets` mode
+    it is a hash of the set of arcs with their hit count buckets, so loops which
+    differ only in number of iterations in the same bucket have the same hash."""
+
+    def __init__(self, mode: str = 'arcs'):
+        if mode not in PATH_HASH_MODES:
+            raise ValueError(f'Unknown path hash mode {mode}')
+        self.mode = mode
+        self.prev_line = 0
+        self.value = _FNV_OFFSET
+        self.arcs: typing.Dict[typing.Tuple[int, int], int] = {}
+
+    def update(self, lineno: int) -> None:
+        if self.mode == 'arcs':
+            arc = (self.prev_line << 32) | lineno
+            self.value = ((self.value ^ arc) * _FNV_PRIME) & _HASH_MASK
+        else:
+            arc = self.prev_line, lineno
+            self.arcs[arc] = self.arcs.get(arc, 0) + 1
+        self.prev_line = lineno
+
+    def hexdigest(self) -> str:
+        value = self.value
+        if self.mode == 'buckets':
+            for (prev_line, lineno), hits in sorted(self.arcs.items()):
+                for part in (prev_line, lineno, _hit_bucket(hits)):
+                    value = ((value ^ part) * _FNV_PRIME) & _HASH_MASK
+        return f'{value:016x}'
+
 
 def _modname(path):
     base = os.path.basename(path)
@@ -10,12 +61,29 @@ def _modname(path):
 
 
 class UtTracer:
-    def __init__(self, sender: typing.Callable[[typing.Tuple[str, int]], None]):
+    def __init__(
+            self,
+            sender: typing.Callable[[typing.Tuple[str, int]], None],
+            scope_filename: typing.Optional[str] = None,
+            path_hash_mode: typing.Optional[str] = None,
+            coverage_bitmap: typing.Optional[CoverageBitmap] = None,
+            ):
+        """Trace lines of all called python functions.
+
+        Lines of `scope_filename` are also hashed if `path_hash_mode` is given
+        and counted in `coverage_bitmap` if it is given."""
         self.globaltrace = self.globaltrace_lt
         self.counts = {}
         self.localtrace = self.localtrace_count
         self.globaltrace = self.globaltrace_lt
         self.sender = sender
+        self.path_hash = None
+        if path_hash_mode is not None:
+            self.path_hash = PathHash(path_hash_mode)
+        self.coverage_bitmap = coverage_bitmap
+        self.scope_filename = None
+        if scope_filename is not None and (self.path_hash or self.coverage_bitmap):
+            self.scope_filename = os.path.normcase(os.path.abspath(scope_filename))
 
     def runfunc(self, func, /, *args, **kw):
         result = None
@@ -43,12 +111,24 @@ class UtTracer:
             self.counts[key] = self.counts.get(key, 0) + 1
         return self.localtrace
 
+    def localtrace_scope(self, frame, why, arg):
+        if why == "line":
+            if self.path_hash is not None:
+                self.path_hash.update(frame.f_lineno)
+            if self.coverage_bitmap is not None:
+                self.coverage_bitmap.hit(frame.f_lineno)
+        self.localtrace_count(frame, why, arg)
+        return self.localtrace_scope
+
     def globaltrace_lt(self, frame, why, arg):
         if why == 'call':
             filename = frame.f_globals.get('__file__', None)
             if filename:
                 modulename = _modname(filename)
                 if modulename is not None:
+                    if self.scope_filename is not None and self.scope_filename == \
+                            os.path.normcase(os.path.abspath(frame.f_code.co_filename)):
+                        return self.localtrace_scope
                     return self.localtrace
             else:
                 return None
@@ -57,6 +137,7 @@ class UtTracer:
 class PureTracer:
     def __init__(self):
         self.counts = []
+        self.path_hash = None
 
     def runfunc(self, func, /, *args, **kw):
         return func(*args, **kw)
@@ -0,0 +1,194 @@
+"""Execution time and memory limits."""
+import ctypes
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Optional, Type
+
+TIMEOUT_EXIT_CODE = 124
+
+
+class ExecutionTimeout(BaseException):
+    """Raised in the executing thread when its time limit is exceeded.
+
+    It is not an `Exception`, so `except Exception` in the tested code does not catch it."""
+
+
+class MemoryLimitExceeded(BaseException):
+    """Raised in the executing thread when its traced memory exceeds the limit."""
+
+
+def _set_async_exc(thread_id: int, exception: type) -> int:
+    return ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id),
+        ctypes.py_object(exception),
+    )
+
+
+def _consume_pending(exception: Type[BaseException]) -> None:
+    """Let pending asynchronous exception be raised and caught here.
+
+    Asynchronous exception is raised on eval loop checks such as backward jumps.
+    Cancelling it with `PyThreadState_SetAsyncExc(id, NULL)` is not reliable:
+    CPython 3.11 keeps the eval breaker set and the thread stalls."""
+    try:
+        for _ in range(100):
+            pass
+    except exception:
+        pass
+
+
+class Watchdog:
+    """Limit execution time of the code inside `with` block.
+
+    After `timeout` seconds `ExecutionTimeout` is raised in the thread which entered
+    the block. It is raised only between bytecodes, so if the block does not finish
+    in `grace` more seconds (blocked in native code or the exception was swallowed)
+    the whole process exits with `TIMEOUT_EXIT_CODE`.
+
+    The watchdog is reused for many blocks: one daemon thread, started at the first
+    limited block, waits on a condition for the deadline of the current block."""
+
+    def __init__(self, timeout: Optional[float] = None, grace: float = 1.0):
+        self.timeout = timeout
+        self.grace = grace
+        self.thread_id: Optional[int] = None
+        self.condition = threading.Condition()
+        self.deadline: Optional[float] = None
+        self.timed_out = False
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+
+    def limit(self, timeout: Optional[float]) -> 'Watchdog':
+        """Set time limit of the next block, `None` for no limit."""
+        self.timeout = timeout
+        return self
+
+    def __enter__(self) -> 'Watchdog':
+        if self.timeout is None:
+            return self
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._watch, name='watchdog', daemon=True)
+                self.thread.start()
+            self.thread_id = threading.get_ident()
+            self.timed_out = False
+            self.deadline = time.monotonic() + self.timeout
+            self.condition.notify()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.timeout is None:
+            return
+        with self.condition:
+            self.deadline = None
+            if self.timed_out and exc_type is not ExecutionTimeout:
+                # the block finished just in time or swallowed the exception
+                _consume_pending(ExecutionTimeout)
+
+    def close(self) -> None:
+        """Stop the watchdog thread."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _watch(self) -> None:
+        with self.condition:
+            while not self.closed:
+                if self.deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                elif not self.timed_out:
+                    logging.debug("Execution timeout, interrupt thread %d", self.thread_id)
+                    self.timed_out = True
+                    _set_async_exc(self.thread_id, ExecutionTimeout)
+                    self.deadline += self.grace
+                else:
+                    logging.error("Execution was not interrupted, exit")
+                    os._exit(TIMEOUT_EXIT_CODE)
+
+
+class MemoryBudget:
+    """Limit memory allocated by the code inside `with` block and measure its peak.
+
+    Memory is traced with `tracemalloc`, which is started only for the block. A polling
+    thread raises `MemoryLimitExceeded` in the thread which entered the block when
+    allocated memory exceeds `limit` bytes. A single allocation larger than the limit
+    is noticed only after it succeeded.
+
+    Allocations of all threads are traced. If `lock` is given, it is held while memory
+    is traced, so threads which allocate only under this lock are not counted."""
+
+    def __init__(
+            self,
+            limit: Optional[int],
+            measure_peak: bool = False,
+            interval: float = 0.005,
+            lock: Optional[threading.Lock] = None,
+            ):
+        self.limit = limit
+        self.tracing_lock = lock
+        self.enabled = limit is not None or measure_peak
+        self.interval = interval
+        self.thread_id: Optional[int] = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.exceeded = False
+        self.started_tracing = False
+        self.baseline = 0
+        self.peak: Optional[int] = None
+        self.poller: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'MemoryBudget':
+        if not self.enabled:
+            return self
+        self.thread_id = threading.get_ident()
+        if self.tracing_lock is not None:
+            self.tracing_lock.acquire()
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        if self.limit is not None:
+            self.poller = threading.Thread(target=self._poll, daemon=True)
+            self.poller.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if not self.enabled:
+            return
+        try:
+            with self.lock:
+                self.stopped.set()
+                if self.exceeded and exc_type is not MemoryLimitExceeded:
+                    _consume_pending(MemoryLimitExceeded)
+            if self.poller is not None:
+                self.poller.join()
+        finally:
+            # the outer watchdog may interrupt the cleanup
+            self.stopped.set()
+            self.peak = max(tracemalloc.get_traced_memory()[1] - self.baseline, 0)
+            if self.started_tracing:
+                tracemalloc.stop()
+            if self.tracing_lock is not None:
+                self.tracing_lock.release()
+
+    def _poll(self) -> None:
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                if self.stopped.is_set():
+                    return
+                if tracemalloc.get_traced_memory()[0] - self.baseline > self.limit:
+                    logging.debug("Memory limit exceeded, interrupt thread %d", self.thread_id)
+                    self.exceeded = True
+                    _set_async_exc(self.thread_id, MemoryLimitExceeded)
+                    return